@@ -4,5 +4,8 @@ This module is used to define for agent.
 
 from .action import ActionAgent
 from .pragya import PragyaGPT
+from .async_action import AsyncActionAgent
+from .async_pragya import AsyncPragyaGPT
+from .snapshot import SnapshotEngine, AsyncSnapshotEngine, SnapshotDiff, PageSnapshot
 
 __all__ = [ "Agent" ]
\ No newline at end of file
@@ -1,4 +1,8 @@
-from helpers import get_filtered_elements
+from helpers import get_filtered_elements, element_selector
+from agent.snapshot import invalidate_snapshot
+from agent.registry import ACTIONS, ActionStats
+from agent.settle import SettleDetector
+from agent.tracing import span
 import time
 from bs4 import BeautifulSoup
 
@@ -12,6 +16,13 @@ class ActionAgent:
         self.page = page
         self.goal_achieved = False
 
+        # Action name -> bound method, so execute never compiles code
+        self.actions = ACTIONS.bind(self)
+        self.stats = ActionStats()
+        # Waits end as soon as the page is stable, see agent.settle
+        self.settle = SettleDetector(page)
+
+    @ACTIONS.implements
     def _google_search(self, text):
         self.page.goto("https://www.google.com")
         elements = get_filtered_elements(self.page)
@@ -21,29 +32,42 @@ class ActionAgent:
                 self._type(element["path"], text)
                 break
 
+    @ACTIONS.implements
     def _go_to_url(self, url):
         self.page.goto(url)
 
-    def _click(self, xpath):
-        self.page.locator(f"xpath={xpath}").click()
+    @ACTIONS.implements
+    def _click(self, target):
+        self.page.locator(element_selector(target)).click()
 
-    def _type(self, xpath, text):
-        # clear that field first
-        self.page.locator(f"xpath={xpath}").fill("")
-        self.page.locator(f"xpath={xpath}").type(f"{text}\n")
+    @ACTIONS.implements
+    def _type(self, target, text):
+        # fill replaces what the field holds, then Enter submits
+        field = self.page.locator(element_selector(target))
+        field.fill(text)
+        field.press("Enter")
 
+    @ACTIONS.implements
     def _scroll_up(self):
         self.page.evaluate("()=>{window.scrollBy(0, -window.innerHeight+200)}")
 
+    @ACTIONS.implements
     def _scroll_down(self):
         self.page.evaluate("()=>{window.scrollBy(0, window.innerHeight-200)}")
 
+    @ACTIONS.implements
     def _wait(self, sec=None):
-        time.sleep(sec if sec else 2)
+        # An explicit duration is honoured, otherwise wait for the page to settle
+        if sec:
+            time.sleep(sec)
+        else:
+            self.settle.wait()
 
+    @ACTIONS.implements
     def _go_back(self):
         self.page.go_back()
 
+    @ACTIONS.implements
     def _set_goal_achieved(self):
         self.goal_achieved = True
         
@@ -52,10 +76,22 @@ class ActionAgent:
         return self.goal_achieved
 
     def execute(self, action, *args):
+        """Validate and run an action of `agent.registry.ACTIONS`, timing it."""
+        args = ACTIONS.check(action, args)
         print(f"\n\nEXECUTING: self.{action}(*{args})\n\n")
-        exec(f"self.{action}(*{args})")
+        started = time.perf_counter()
+        ok = False
+        try:
+            with span("action", action=action, url=self.page.url):
+                self.actions[action](*args)
+            ok = True
+        finally:
+            self.stats.record(action, time.perf_counter() - started, ok)
+            # Whatever the action did, the page snapshot has to be taken again
+            invalidate_snapshot(self.page)
 
     def wait_till_idle(self):
-        self.page.wait_for_load_state("domcontentloaded")
+        """Wait until the network and the DOM are quiet, return the seconds waited."""
+        return self.settle.wait()
 
 
@@ -0,0 +1,90 @@
+import time
+import asyncio
+from helpers import get_filtered_elements_async, element_selector
+from agent.snapshot import invalidate_snapshot
+from agent.registry import ACTIONS, ActionStats
+from agent.settle import AsyncSettleDetector
+from agent.tracing import span
+
+
+class AsyncActionAgent:
+    """
+    Asyncio counterpart of `ActionAgent` for `playwright.async_api` pages.
+
+    Waits yield to the event loop instead of blocking it, so other sessions
+    keep running while this one waits for its page.
+    """
+
+    def __init__(self, page) -> None:
+        self.page = page
+        self.goal_achieved = False
+
+        self.actions = ACTIONS.bind(self)
+        self.stats = ActionStats()
+        self.settle = AsyncSettleDetector(page)
+
+    @ACTIONS.implements
+    async def _google_search(self, text):
+        await self.page.goto("https://www.google.com")
+        elements = await get_filtered_elements_async(self.page)
+        for element in elements:
+            if "search" == str(element["ariaLabel"]).lower():
+                await self._type(element["path"], text)
+                break
+
+    @ACTIONS.implements
+    async def _go_to_url(self, url):
+        await self.page.goto(url)
+
+    @ACTIONS.implements
+    async def _click(self, target):
+        await self.page.locator(element_selector(target)).click()
+
+    @ACTIONS.implements
+    async def _type(self, target, text):
+        # fill replaces what the field holds, then Enter submits
+        field = self.page.locator(element_selector(target))
+        await field.fill(text)
+        await field.press("Enter")
+
+    @ACTIONS.implements
+    async def _scroll_up(self):
+        await self.page.evaluate("()=>{window.scrollBy(0, -window.innerHeight+200)}")
+
+    @ACTIONS.implements
+    async def _scroll_down(self):
+        await self.page.evaluate("()=>{window.scrollBy(0, window.innerHeight-200)}")
+
+    @ACTIONS.implements
+    async def _wait(self, sec=None):
+        if sec:
+            await asyncio.sleep(sec)
+        else:
+            await self.settle.wait()
+
+    @ACTIONS.implements
+    async def _go_back(self):
+        await self.page.go_back()
+
+    @ACTIONS.implements
+    async def _set_goal_achieved(self):
+        self.goal_achieved = True
+
+    def get_goal_achieved(self):
+        return self.goal_achieved
+
+    async def execute(self, action, *args):
+        args = ACTIONS.check(action, args)
+        print(f"\n\nEXECUTING: self.{action}(*{args})\n\n")
+        started = time.perf_counter()
+        ok = False
+        try:
+            with span("action", action=action, url=self.page.url):
+                await self.actions[action](*args)
+            ok = True
+        finally:
+            self.stats.record(action, time.perf_counter() - started, ok)
+            invalidate_snapshot(self.page)
+
+    async def wait_till_idle(self):
+        return await self.settle.wait()
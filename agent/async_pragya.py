@@ -0,0 +1,135 @@
+import time
+import inspect
+from agent.pragya import PragyaGPT
+from agent.fingerprint import state_fingerprint
+from agent.streaming import StreamingJSONParser
+from agent.tracing import span, current_span
+
+
+class AsyncPragyaGPT(PragyaGPT):
+    """
+    Asyncio counterpart of `PragyaGPT`.
+
+    Prompts, history and the parsing of replies are shared with `PragyaGPT`;
+    only the LLM round trips are awaitable, so many sessions can wait on the
+    API from a single event loop.
+    """
+
+    async def get_final_goal(self, objective):
+        request = self._final_goal_request(objective)
+        with span("llm.final_goal", model=request["model"]):
+            response = await self._complete(**request)
+        self.final_goal = response
+
+        return response
+
+    async def get_first_step(self, objective, error=None, on_command=None):
+        request = self._first_step_request(objective, error)
+        # There is no page yet, so no element id is valid in the first step
+        with span("llm.first_step", model=request["model"], stream=self.stream):
+            if self.stream:
+                return await self._stream_action(request, on_command, "FIRST STEP RESPONSE", set())
+            response = await self._complete(**request)
+        return self._record_action(response, "FIRST STEP RESPONSE", set())
+
+    async def _observation(self, current_url, current_page_elements):
+        state = state_fingerprint(current_url, current_page_elements)
+        if self._observed(state):
+            return self.temp_objective
+        request = self._observation_request(current_url, current_page_elements, state)
+        with span("llm.observation", model=request["model"]):
+            self.temp_objective = await self._complete(**request)
+        self.observed_state = state
+        return self.temp_objective
+
+    async def _next_action(self, objective, current_url, current_page_elements, error=None, on_command=None):
+        element_ids = self._element_ids(current_page_elements)
+        state = state_fingerprint(current_url, current_page_elements)
+        tier = self._first_tier(error)
+
+        print("Chat completion start....")
+
+        while True:
+            request = self._next_action_request(objective, current_url, current_page_elements, error,
+                                                self._tier_model(tier), state)
+            with span(self._action_span, model=request["model"], stream=self.stream, tier=tier):
+                started = time.perf_counter()
+                streamed = command_error = None
+                if self.stream:
+                    response, streamed, command_error = await self._stream_reply(
+                        request, on_command, element_ids, self._cascade_gate(tier, state))
+                else:
+                    response = await self._complete(**request)
+                next_step = self._cascade_action(tier, response, element_ids, state, streamed, started)
+            if next_step is not None:
+                break
+            tier += 1
+
+        print("Chat completion end....")
+
+        self._remember_action(next_step, "NEXT ACTION RESPONSE")
+        if command_error is not None:
+            raise command_error
+        return next_step
+
+    async def _complete(self, messages, **params):
+        key = self._cache_key(messages, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                return cached
+
+        completion = await self.provider.acomplete(messages, **params)
+        response = completion.content
+        self._record_usage(completion.usage)
+
+        if key is not None:
+            self.cache.put(key, response, model=params.get("model"))
+        return response
+
+    async def _stream_action(self, request, on_command, title, element_ids=None):
+        """Like `PragyaGPT._stream_action`; `on_command` may be a coroutine function."""
+        response, streamed, command_error = await self._stream_reply(request, on_command, element_ids)
+        json_response = self._remember_action(self._parse_reply(response, element_ids, streamed), title)
+        if command_error is not None:
+            raise command_error
+        return json_response
+
+    async def _stream_reply(self, request, on_command, element_ids=None, gate=None):
+        parser = StreamingJSONParser()
+        streamed = command_error = None
+        async for chunk in self._complete_stream(**self._stream_request(request)):
+            self._trace_chunk(parser)
+            for command in self._streamed_commands(parser, chunk, element_ids):
+                if streamed is not None or (gate is not None and not gate(command)):
+                    continue
+                self._trace_command()
+                streamed = command
+                if on_command is not None:
+                    try:
+                        result = on_command(command)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as e:
+                        command_error = e
+        return parser.text, streamed, command_error
+
+    async def _complete_stream(self, messages, **params):
+        key = self._cache_key(messages, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                yield cached
+                return
+
+        chunks = []
+        stream = self.provider.astream(messages, **params)
+        async for content in stream:
+            chunks.append(content)
+            yield content
+        self._record_usage(stream.usage)
+
+        if key is not None:
+            self.cache.put(key, "".join(chunks), model=params.get("model"))
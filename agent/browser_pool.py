@@ -0,0 +1,293 @@
+"""
+Pool of warm browser processes.
+
+Launching Chromium dominates short objectives, so instead of one browser per
+objective the pool keeps a few browsers running and hands out a fresh,
+isolated `BrowserContext` per objective. Browsers are recycled after a number
+of contexts or once they use too much memory, and disconnected browsers are
+replaced on the next acquire. The pool can also attach to a browser that is
+already running, over CDP.
+
+`BrowserPool` is for `playwright.sync_api`, `AsyncBrowserPool` for
+`playwright.async_api`.
+"""
+import asyncio
+from contextlib import contextmanager, asynccontextmanager
+from helpers import register_element_engine, register_element_engine_async
+
+
+class PoolExhaustedError(Exception):
+    """Raised when every browser of the pool is busy and the pool is full."""
+
+
+class PooledBrowser:
+    """A browser of the pool with its usage bookkeeping."""
+
+    def __init__(self, browser, over_cdp=False):
+        self.browser = browser
+        self.over_cdp = over_cdp
+        self.uses = 0
+        self.contexts = set()
+        self.draining = False
+
+    def __repr__(self):
+        return "PooledBrowser(uses={}, active={}{})".format(
+            self.uses, len(self.contexts), ", draining" if self.draining else ""
+        )
+
+
+def _rss_mb(pids):
+    """Resident memory of the given processes in MB, None if unavailable."""
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            return None
+    return total_kb / 1024
+
+
+class _BrowserPoolBase:
+    def __init__(
+        self,
+        playwright,
+        size=2,
+        contexts_per_browser=4,
+        max_uses=50,
+        max_memory_mb=None,
+        cdp_url=None,
+        launch_options=None,
+        context_options=None,
+    ):
+        """
+        `size` is the maximum number of browsers, `contexts_per_browser` the
+        number of contexts a browser serves at the same time. A browser is
+        recycled after `max_uses` contexts or when its processes use more than
+        `max_memory_mb` (checked when a context is released). With `cdp_url`
+        the pool attaches to that browser instead of launching its own.
+        """
+        self.playwright = playwright
+        self.size = 1 if cdp_url else size
+        self.contexts_per_browser = contexts_per_browser
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.cdp_url = cdp_url
+        self.launch_options = launch_options or {"headless": True}
+        self.context_options = context_options or {}
+
+        self.browsers = []
+        self.stats = {"launched": 0, "recycled": 0, "unhealthy": 0, "contexts": 0}
+
+    def _pick(self):
+        """The least busy healthy browser that can take one more context."""
+        available = [
+            pooled for pooled in self.browsers
+            if not pooled.draining and len(pooled.contexts) < self.contexts_per_browser
+        ]
+        if not available:
+            return None
+        return min(available, key=lambda pooled: len(pooled.contexts))
+
+    def _find(self, context):
+        for pooled in self.browsers:
+            if context in pooled.contexts:
+                return pooled
+        return None
+
+    def _should_recycle(self, pooled, memory_mb):
+        if pooled.uses >= self.max_uses:
+            return True
+        return self.max_memory_mb is not None and memory_mb is not None and memory_mb > self.max_memory_mb
+
+    def _drop_unhealthy(self):
+        for pooled in list(self.browsers):
+            if not pooled.browser.is_connected():
+                self.browsers.remove(pooled)
+                self.stats["unhealthy"] += 1
+
+    def _memory_pids(self, process_info):
+        return [process["id"] for process in process_info.get("processInfo", [])]
+
+
+class BrowserPool(_BrowserPoolBase):
+    """Browser pool for `playwright.sync_api`."""
+
+    def acquire(self, **context_options):
+        """Return a new `BrowserContext` on a warm browser."""
+        self._drop_unhealthy()
+        pooled = self._pick()
+        if pooled is None:
+            if len(self.browsers) >= self.size:
+                raise PoolExhaustedError(f"all {self.size} browsers are busy")
+            pooled = self._start()
+
+        options = {**self.context_options, **context_options}
+        context = pooled.browser.new_context(**options)
+        pooled.contexts.add(context)
+        pooled.uses += 1
+        self.stats["contexts"] += 1
+        return context
+
+    def release(self, context):
+        """Close `context` and recycle its browser if it is due."""
+        pooled = self._find(context)
+        try:
+            context.close()
+        except Exception as e:
+            print("Error (closing pooled context): " + str(e))
+        if pooled is None:
+            return
+
+        pooled.contexts.discard(context)
+        if not pooled.draining and self._should_recycle(pooled, self.memory_mb(pooled)):
+            pooled.draining = True
+        if pooled.draining and not pooled.contexts:
+            self._close(pooled)
+            self.stats["recycled"] += 1
+
+    @contextmanager
+    def context(self, **context_options):
+        """`with pool.context() as context:` acquires and releases a context."""
+        context = self.acquire(**context_options)
+        try:
+            yield context
+        finally:
+            self.release(context)
+
+    def memory_mb(self, pooled):
+        """Resident memory of a locally launched browser, None if unknown."""
+        if pooled.over_cdp or self.max_memory_mb is None:
+            return None
+        try:
+            session = pooled.browser.new_browser_cdp_session()
+            process_info = session.send("SystemInfo.getProcessInfo")
+            session.detach()
+        except Exception:
+            return None
+        return _rss_mb(self._memory_pids(process_info))
+
+    def close(self):
+        for pooled in list(self.browsers):
+            self._close(pooled)
+
+    def _start(self):
+        # Before any context exists, contexts only get the engines registered at creation
+        register_element_engine(self.playwright)
+        if self.cdp_url:
+            browser = self.playwright.chromium.connect_over_cdp(self.cdp_url)
+        else:
+            browser = self.playwright.chromium.launch(**self.launch_options)
+        pooled = PooledBrowser(browser, over_cdp=bool(self.cdp_url))
+        self.browsers.append(pooled)
+        self.stats["launched"] += 1
+        return pooled
+
+    def _close(self, pooled):
+        if pooled in self.browsers:
+            self.browsers.remove(pooled)
+        try:
+            pooled.browser.close()
+        except Exception as e:
+            print("Error (closing pooled browser): " + str(e))
+
+
+class AsyncBrowserPool(_BrowserPoolBase):
+    """
+    Browser pool for `playwright.async_api`.
+
+    When the pool is full, `acquire` waits for a context to be released
+    instead of raising.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, **context_options):
+        async with self._changed:
+            while True:
+                self._drop_unhealthy()
+                pooled = self._pick()
+                if pooled is not None:
+                    break
+                if len(self.browsers) < self.size:
+                    pooled = await self._start()
+                    break
+                await self._changed.wait()
+
+            # Reserve the slot before awaiting so that concurrent acquires see it
+            pooled.uses += 1
+            placeholder = object()
+            pooled.contexts.add(placeholder)
+
+        try:
+            options = {**self.context_options, **context_options}
+            context = await pooled.browser.new_context(**options)
+        finally:
+            pooled.contexts.discard(placeholder)
+        pooled.contexts.add(context)
+        self.stats["contexts"] += 1
+        return context
+
+    async def release(self, context):
+        pooled = self._find(context)
+        try:
+            await context.close()
+        except Exception as e:
+            print("Error (closing pooled context): " + str(e))
+
+        async with self._changed:
+            if pooled is not None:
+                pooled.contexts.discard(context)
+                if not pooled.draining and self._should_recycle(pooled, await self.memory_mb(pooled)):
+                    pooled.draining = True
+                if pooled.draining and not pooled.contexts:
+                    await self._close(pooled)
+                    self.stats["recycled"] += 1
+            self._changed.notify_all()
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        context = await self.acquire(**context_options)
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    async def memory_mb(self, pooled):
+        if pooled.over_cdp or self.max_memory_mb is None:
+            return None
+        try:
+            session = await pooled.browser.new_browser_cdp_session()
+            process_info = await session.send("SystemInfo.getProcessInfo")
+            await session.detach()
+        except Exception:
+            return None
+        return _rss_mb(self._memory_pids(process_info))
+
+    async def close(self):
+        for pooled in list(self.browsers):
+            await self._close(pooled)
+
+    async def _start(self):
+        await register_element_engine_async(self.playwright)
+        if self.cdp_url:
+            browser = await self.playwright.chromium.connect_over_cdp(self.cdp_url)
+        else:
+            browser = await self.playwright.chromium.launch(**self.launch_options)
+        pooled = PooledBrowser(browser, over_cdp=bool(self.cdp_url))
+        self.browsers.append(pooled)
+        self.stats["launched"] += 1
+        return pooled
+
+    async def _close(self, pooled):
+        if pooled in self.browsers:
+            self.browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            print("Error (closing pooled browser): " + str(e))
@@ -0,0 +1,88 @@
+"""
+Model cascade for the next action.
+
+Routine steps are sent to the small, fast model; the step is handed to the
+next (larger) model when the small one is not to be trusted with it:
+
+    error      the previous attempt of the step failed
+    invalid    the reply is not a usable action (bad JSON, unknown action,
+               an element id that is not on the page)
+    repeat     the command is the one just taken on the same page (same URL
+               and elements, see agent.fingerprint), a sign of a loop
+               (scrolls, waits and going back are repeated on purpose)
+
+The requests, latency and escalations (with their reasons) are recorded per
+tier, to tune the policy.
+
+Configured through the environment:
+    PRAGYA_LLM_CASCADE=llama3-8b-8192,llama3-70b-8192   (small to large, "off" asks the agent's model only)
+"""
+import os
+import json
+
+# Commands that are expected to come twice in a row
+REPEATABLE_ACTIONS = {"_scroll_up", "_scroll_down", "_wait", "_go_back"}
+
+
+class ModelCascade:
+    def __init__(self, models):
+        # Small to large, without duplicates
+        self.models = list(dict.fromkeys(models))
+        if not self.models:
+            raise ValueError("a model cascade needs at least one model")
+        self.tiers = {model: {"requests": 0, "accepted": 0, "escalated": 0, "errors": 0, "seconds": 0.0}
+                      for model in self.models}
+        self.escalations = {}
+        self.last = None
+
+    @classmethod
+    def from_env(cls, default):
+        """The cascade configured by `PRAGYA_LLM_CASCADE` (`default` models when unset), None when off."""
+        configured = os.environ.get("PRAGYA_LLM_CASCADE", "").strip()
+        if configured.lower() in ("off", "0", "false"):
+            return None
+        return cls([model.strip() for model in configured.split(",") if model.strip()] or default)
+
+    def is_last(self, tier):
+        return tier >= len(self.models) - 1
+
+    def first_tier(self, error=None):
+        """Tier to ask first: the largest one when the previous attempt failed."""
+        if error is not None and not self.is_last(0):
+            self.escalations["error"] = self.escalations.get("error", 0) + 1
+            return len(self.models) - 1
+        return 0
+
+    def review(self, tier, command, state):
+        """Reason to hand the step to the next tier, None when `command` is taken in `state` (the page fingerprint)."""
+        # A snapshot, the command dict may be changed once it is executed
+        taken = (state, command["action"], json.dumps(command.get("args", []), sort_keys=True, default=str))
+        if not self.is_last(tier) and taken == self.last and command["action"] not in REPEATABLE_ACTIONS:
+            return "repeat"
+        self.last = taken
+        return None
+
+    def record(self, tier, seconds, reason=None, failed=False):
+        """Count a reply of `tier`, escalated for `reason` or accepted (or `failed` on the last tier)."""
+        entry = self.tiers[self.models[tier]]
+        entry["requests"] += 1
+        entry["seconds"] += seconds
+        if failed:
+            entry["errors"] += 1
+        elif reason is not None:
+            entry["escalated"] += 1
+            self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        else:
+            entry["accepted"] += 1
+
+    def summary(self):
+        tiers = {}
+        for model, entry in self.tiers.items():
+            requests = entry["requests"]
+            tiers[model] = {
+                **entry,
+                "seconds": round(entry["seconds"], 3),
+                "mean_ms": round(entry["seconds"] / requests * 1000, 1) if requests else 0.0,
+                "escalation_rate": round(entry["escalated"] / requests, 3) if requests else 0.0,
+            }
+        return {"tiers": tiers, "escalations": dict(self.escalations)}
@@ -0,0 +1,60 @@
+"""
+Serialization of page elements for the prompts.
+
+The original encoding is Python's `str()` of the list of dicts, which repeats
+every key, quote and brace per element. The compact encoding writes one line
+per element with fixed columns and drops trailing empty fields:
+
+    id|text|ariaLabel|placeholder|label
+    0|Gmail
+    3||Search|Search Google
+"""
+
+COMPACT_COLUMNS = ("id", "text", "ariaLabel", "placeholder", "label")
+
+
+def _cell(value, max_chars):
+    text = " ".join(str(value).split()).replace("|", "/")
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars].rstrip() + "..."
+    return text
+
+
+def format_repr(elements):
+    """The original encoding: `str()` of the list of element dicts."""
+    return str(list(elements))
+
+
+def format_compact(elements, max_chars=120):
+    """One `|`-separated line per element, long texts cut at `max_chars`."""
+    lines = ["|".join(COMPACT_COLUMNS)]
+    for element in elements:
+        cells = [_cell(element.get(column, ""), max_chars) for column in COMPACT_COLUMNS]
+        while cells and not cells[-1]:
+            cells.pop()
+        lines.append("|".join(cells))
+    return "\n".join(lines)
+
+
+ELEMENT_FORMATS = {
+    "repr": format_repr,
+    "compact": format_compact,
+}
+
+# Encoding used per model, models not listed use DEFAULT_ELEMENT_FORMAT
+MODEL_ELEMENT_FORMATS = {
+    "llama3-8b-8192": "compact",
+    "llama3-70b-8192": "compact",
+    "mixtral-8x7b-32768": "compact",
+    "gemma-7b-it": "repr",
+}
+
+DEFAULT_ELEMENT_FORMAT = "compact"
+
+
+def element_format_for(model, override=None):
+    """Name of the encoding to use for `model` (`override` wins when given)."""
+    name = override or MODEL_ELEMENT_FORMATS.get(model, DEFAULT_ELEMENT_FORMAT)
+    if name not in ELEMENT_FORMATS:
+        raise ValueError(f"unknown element format {name!r}, expected one of {list(ELEMENT_FORMATS)}")
+    return name
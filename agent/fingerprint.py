@@ -0,0 +1,19 @@
+"""
+Fingerprint of the page state the agent sees.
+
+Two steps see the same page when their URL and cleaned elements (what the
+prompts list) are the same, whatever happened in between: a scroll or a wait
+that changed nothing, a click that failed. `state_fingerprint` identifies
+that state, so that an unchanged page is not observed again, a command
+repeated on it can be told from progress (see agent.cascade), and the work
+done per page (the element ranking) is reused.
+"""
+import json
+import hashlib
+
+
+def state_fingerprint(url, elements):
+    """Hash of `url` and the cleaned `elements` of the page."""
+    digest = hashlib.sha256(str(url).encode("utf-8"))
+    digest.update(json.dumps(elements, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,135 @@
+"""
+Disk-backed cache of LLM replies.
+
+Entries are content-addressed: the key is a hash of the model, the request
+parameters and the normalized message list, so re-running the same objective
+with the same prompts is answered from disk. The cache is bounded by size and
+age (least recently used entries go first), and in replay mode a miss raises
+instead of calling the API, so whole runs can be replayed offline.
+
+Configured through the environment:
+    PRAGYA_LLM_CACHE=on|replay    (unset or "off" disables the cache)
+    PRAGYA_LLM_CACHE_DIR=.llm_cache
+"""
+import os
+import json
+import time
+import hashlib
+
+
+class CacheMissError(Exception):
+    """Raised in replay mode when a request is not in the cache."""
+
+
+class LLMCache:
+    MODES = ("on", "replay")
+
+    def __init__(self, directory=".llm_cache", mode="on", max_bytes=256 * 1024 * 1024, max_age=30 * 24 * 3600):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown LLM cache mode {mode!r}, expected one of {self.MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._entries())
+
+    @classmethod
+    def from_env(cls):
+        """The cache configured by `PRAGYA_LLM_CACHE`, or None when disabled."""
+        mode = os.environ.get("PRAGYA_LLM_CACHE", "off").strip().lower()
+        if mode in ("", "off", "0", "false"):
+            return None
+        if mode in ("1", "true"):
+            mode = "on"
+        return cls(directory=os.environ.get("PRAGYA_LLM_CACHE_DIR", ".llm_cache"), mode=mode)
+
+    @staticmethod
+    def key(messages, **params):
+        """Hash of the request; whitespace differences in prompts do not matter."""
+        normalized = [
+            {
+                "role": message["role"],
+                "content": " ".join(
+                    (message["content"] if isinstance(message["content"], str)
+                     else json.dumps(message["content"], sort_keys=True)).split()
+                ),
+            }
+            for message in messages
+        ]
+        payload = json.dumps({"messages": normalized, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached reply for `key`, None on a miss (or raise in replay mode)."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMissError(f"no cached LLM reply for request {key}")
+            return None
+
+        os.utime(path)  # Keep recently used entries longest
+        self.hits += 1
+        return entry["content"]
+
+    def put(self, key, content, **meta):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"content": content, "created": time.time(), **meta}, f)
+        os.replace(tmp_path, path)
+
+        self._size += os.path.getsize(path) - previous
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under `max_bytes`."""
+        now = time.time()
+        entries = []
+        for path in self._entries():
+            mtime = os.path.getmtime(path)
+            if now - mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((mtime, path))
+
+        self._size = sum(os.path.getsize(path) for _, path in entries)
+        for _, path in sorted(entries):
+            if self._size <= self.max_bytes:
+                break
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._size -= size
+        except OSError:
+            pass
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def __repr__(self):
+        return f"LLMCache({self.directory!r}, mode={self.mode}, hits={self.hits}, misses={self.misses})"
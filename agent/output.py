@@ -0,0 +1,154 @@
+"""
+Structured parsing of the LLM action replies.
+
+An action reply is a JSON object with `thoughts` and a `command` holding the
+`action` name and its `args`. `parse_action` reads it in one pass, repairs
+the usual defects locally (code fences, chatter around the object, trailing
+commas, a reply cut off before its closing braces, `"id 3"` element ids,
+`click` for `_click`, a single argument not wrapped in a list) and validates
+the action name and its arguments against `agent.registry.ACTIONS`. Only replies that cannot be recovered
+raise `ActionParseError`, whose message is meant to be sent back to the LLM.
+"""
+import re
+import json
+from agent.registry import ACTIONS, ActionError
+
+
+class ActionParseError(ActionError):
+    """Raised when an LLM reply is not a usable action."""
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+_CALL_RE = re.compile(r"^\s*(\w+)\s*\((.*)\)\s*$", re.S)
+
+
+def repair_json(text):
+    """
+    Return the first JSON object or array of `text` as strict JSON.
+
+    Surrounding text is dropped, trailing commas are removed and brackets or
+    a string left open by a truncated reply are closed, all in one pass.
+    """
+    start = next((i for i, char in enumerate(text) if char in "{["), None)
+    if start is None:
+        raise ActionParseError("the reply contains no JSON object")
+
+    out = []
+    stack = []
+    in_string = escaped = False
+    pending_comma = None  # Index in `out` of a comma that may turn out to be trailing
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char in " \t\r\n":
+            out.append(char)
+            continue
+        if char in "}]":
+            if pending_comma is not None:
+                out[pending_comma] = ""
+            pending_comma = None
+            if not stack:
+                break
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                break
+            continue
+        pending_comma = None
+        if char == ",":
+            pending_comma = len(out)
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        out.append(char)
+
+    if in_string:
+        out.append('"')
+    if pending_comma is not None:
+        out[pending_comma] = ""
+    out.extend(_CLOSERS[opener] for opener in reversed(stack))
+    return "".join(out)
+
+
+def parse_json(text):
+    """Parse the first JSON value of `text`, repairing it if needed."""
+    try:
+        return json.loads(repair_json(text))
+    except json.JSONDecodeError as e:
+        raise ActionParseError(f"the reply is not valid JSON ({e})") from None
+
+
+def parse_action(text, element_ids=None):
+    """
+    Parse and validate an action reply.
+
+    Returns `{"thoughts": {...}, "command": {"action": ..., "args": [...]}}`
+    with element ids as ints, plus the `observation` of the observe-and-act
+    replies. When `element_ids` is given, ids that are not on the page are
+    rejected.
+    """
+    reply = parse_json(text)
+    if not isinstance(reply, dict):
+        raise ActionParseError("the reply must be a JSON object with \"thoughts\" and \"command\"")
+
+    command = reply.get("command")
+    if command is None and "action" in reply:  # Command given at the top level
+        command = {"action": reply["action"], "args": reply.get("args", [])}
+    if command is None:
+        raise ActionParseError("the reply has no \"command\"")
+
+    thoughts = reply.get("thoughts")
+    if not isinstance(thoughts, dict):
+        thoughts = {"text": "" if thoughts is None else str(thoughts), "reasoning": ""}
+
+    action = {"command": normalize_command(command, element_ids), "thoughts": thoughts}
+    if reply.get("observation") is not None:
+        action["observation"] = str(reply["observation"])
+    return action
+
+
+def normalize_command(command, element_ids=None):
+    """Validate a `command` object and coerce its arguments."""
+    if isinstance(command, str):  # e.g. "_click(3)"
+        command = {"action": command}
+    if not isinstance(command, dict) or not isinstance(command.get("action"), str):
+        raise ActionParseError("\"command\" must be an object with an \"action\" name")
+
+    action = command["action"].strip()
+    args = command.get("args", [])
+    call = _CALL_RE.match(action)
+    if call:
+        action = call.group(1)
+        if not args and call.group(2).strip():
+            args = _call_args(call.group(2))
+    if not action.startswith("_"):
+        action = "_" + action
+
+    if args is None:
+        args = []
+    elif isinstance(args, dict):
+        args = list(args.values())
+    elif not isinstance(args, list):
+        args = [args]
+
+    # Extra arguments are usually copied from the example ("arg1", "arg2")
+    try:
+        args = ACTIONS.coerce(action, args, element_ids)
+    except ActionError as e:
+        raise ActionParseError(str(e)) from None
+
+    return {"action": action, "args": args}
+
+
+def _call_args(text):
+    try:
+        return json.loads("[" + text + "]")
+    except json.JSONDecodeError:
+        return [part.strip().strip("'\"") for part in text.split(",")]
@@ -1,18 +1,26 @@
-import os
 import json
+import time
 from dotenv import load_dotenv
-from crewai import Agent, Task, Crew
-from langchain_groq import ChatGroq
-from groq import Groq
-from langchain_core.prompts import ChatPromptTemplate
-from helpers import parse_json_garbage, get_actions_taken, get_actions_taken_with_thoughts
+from agent.llm_cache import LLMCache
+from agent.providers import provider_from_env
+from agent.scheduler import ScheduledProvider
+from agent.cascade import ModelCascade
+from agent.fingerprint import state_fingerprint
+from agent.prompt_builder import PromptBuilder
+from agent.ranking import ElementRanker
+from agent.element_format import element_format_for
+from agent.streaming import StreamingJSONParser
+from agent.output import parse_action, normalize_command, ActionParseError
+from agent.tracing import span, current_span
 from agent.prompt import FIRST_STEP_ACTION_DESCRIPTION_PROMPT, FIRST_STEP_ACTION_GOAL_PROMPT, NEXT_STEP_ACTION_DESCRIPTION_PROMPT, NEXT_STEP_ACTION_GOAL_PROMPT
+from agent.prompt import OBSERVE_AND_ACT_DESCRIPTION_PROMPT, OBSERVE_AND_ACT_GOAL_PROMPT
 
 load_dotenv()
 
 
 class PragyaGPT:
-    def __init__(self, model=None):
+    def __init__(self, model=None, cache=None, prompt_budget=6000, recent_actions=3, top_k_elements=40,
+                 element_format=None, stream=False, provider=None, priority=0, cascade=None, observe_and_act=False):
         self.available_model = ['llama3-8b-8192', 'llama3-70b-8192', 'llama2-70b-4096'
                                 'mixtral-8x7b-32768', 'gemma-7b-it']
         self.model = model if model else self.available_model[1]
@@ -20,14 +28,53 @@ class PragyaGPT:
 
         self.history = []
         self.actions_taken = []
+        # The last observation of the page, fed to the next action, and the
+        # fingerprint of the page it was made on (see agent.fingerprint)
         self.temp_objective: str = None
+        self.observed_state = None
+        self.objective: str = None
         self.final_goal: str = None
 
-        self.client = Groq(
-            api_key=os.environ.get("GROQ_API_KEY"),
-        )
+        # Replies of identical requests are served from disk when enabled
+        self.cache = cache if cache is not None else LLMCache.from_env()
+
+        # Keeps the growing sections (actions, observation, elements) in budget
+        self.prompt_builder = PromptBuilder(budget=prompt_budget, recent_actions=recent_actions)
+        # None picks the element encoding per model, see agent.element_format
+        self.element_format = element_format
+        self.last_prompt_report = None
+
+        # Only the elements most related to the objective go into the prompts
+        self.ranker = ElementRanker(top_k=top_k_elements)
+
+        # Stream action replies and hand out the command before the thoughts end
+        self.stream = stream
+
+        # One call per step that returns the observation with the next action,
+        # instead of an observation call and an action call
+        self.observe_and_act = observe_and_act
+
+        # Where the requests go (Groq by default), see agent.providers; they wait
+        # for the rate limits in the process-wide queue, sessions with a lower
+        # `priority` first (see agent.scheduler)
+        self.provider = ScheduledProvider(provider if provider is not None else provider_from_env(), priority=priority)
+        # `avoided` counts the requests not sent because the page did not change
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "avoided": 0}
+
+        # The next action is asked to the small model first, and to the larger
+        # ones when its reply is not trusted (see agent.cascade); None asks self.model
+        self.cascade = cascade if cascade is not None else ModelCascade.from_env([self.available_model[0], self.model])
 
     def get_final_goal(self, objective):
+        request = self._final_goal_request(objective)
+        with span("llm.final_goal", model=request["model"]):
+            response = self._complete(**request)
+        self.final_goal = response
+
+        return response
+
+    def _final_goal_request(self, objective):
+        self.objective = objective
 
         system_prompt = """ROLE: "Final_Goal_Decider_Agent"
 
@@ -44,7 +91,7 @@ class PragyaGPT:
         EXPECTED OUTPUT: "A short, simple and precise goal that user wants to achieve with the help of browser. Only give the final goal in the response nothing else. And also what could be the possible steps to achieve the final goal."
         """.format(objective=objective)
 
-        chat_completion = self.client.chat.completions.create(
+        return dict(
             messages=[
                 {
                     "role": "system",
@@ -57,18 +104,21 @@ class PragyaGPT:
             ],
             model=self.model,
             temperature=1,
-            stream=False,
             top_p=1,
             stop=None,
             # response_format={"type": "json_object"}, # Enable JSON mode by setting the response format
         )
 
-        response = chat_completion.choices[0].message.content
-        self.final_goal = response
-
-        return response
+    def get_first_step(self, objective, error=None, on_command=None):
+        request = self._first_step_request(objective, error)
+        # There is no page yet, so no element id is valid in the first step
+        with span("llm.first_step", model=request["model"], stream=self.stream):
+            if self.stream:
+                return self._stream_action(request, on_command, "FIRST STEP RESPONSE", set())
+            response = self._complete(**request)
+        return self._record_action(response, "FIRST STEP RESPONSE", set())
 
-    def get_first_step(self, objective, error=None):
+    def _first_step_request(self, objective, error=None):
         system = """ROLE: "Human like robot browsing the web."
 
         GOAL: "Give next action with your thoughts needed to perform in browser."
@@ -99,35 +149,36 @@ class PragyaGPT:
 
         self.history.extend(chat)  # Add chat to history
 
-        chat_completion = self.client.chat.completions.create(
+        return dict(
             messages=chat,
             model=self.model,
             temperature=1,
-            stream=False,
             top_p=1,
             stop=None,
             # Enable JSON mode by setting the response format
             response_format={"type": "json_object"},
         )
 
-        response = chat_completion.choices[0].message.content
-        json_response = parse_json_garbage(response)
-        print("\nFIRST STEP RESPONSE:\n")
-        print(json.dumps(json_response, indent=4))
-        print("\n")
-
-        self.history.append(
-            {
-                "role": "assistant",
-                "content": json_response
-            }
-        )  # Add assistant response to history
-        self.actions_taken.append(json_response)
-
-        return json_response
-
     def _observation(self, current_url, current_page_elements):
-
+        state = state_fingerprint(current_url, current_page_elements)
+        if self._observed(state):
+            return self.temp_objective
+        request = self._observation_request(current_url, current_page_elements, state)
+        with span("llm.observation", model=request["model"]):
+            self.temp_objective = self._complete(**request)
+        self.observed_state = state
+        return self.temp_objective
+
+    def _observed(self, state):
+        """Whether the page in `state` is the one last observed, whose observation is then reused."""
+        if self.temp_objective is None or state != self.observed_state:
+            return False
+        self.usage["avoided"] += 1
+        current_span().set(observation_reused=True)
+        print("Page unchanged, reusing the last observation")
+        return True
+
+    def _observation_request(self, current_url, current_page_elements, state=None):
         system = """ROLE: "Human like robot browsing the web and observe agent."
 
         GOAL: "Analyse the current page elements and give your observation about the current page. And also whether our actions are making us to go near to the final goal or not, if not then reason and what can be done."
@@ -136,7 +187,7 @@ class PragyaGPT:
         You always browse number of websites and visit different websites and observe what elements are present on the page and there work."
         """
 
-        human = """DESCRIPTION: "Analyse the current page elements and give your observation.
+        human_template = """DESCRIPTION: "Analyse the current page elements and give your observation.
         The current page URL is: {current_url} and the current page elements are:
         {current_page_elements}
 
@@ -146,7 +197,14 @@ class PragyaGPT:
         {actions_taken}
 
         EXPECTED OUTPUT: "A very short, simple and precise observation paragraph from the current page elements that where we are and what could be our next step to achieve the final goal."
-        """.format(current_page_elements=current_page_elements, current_url=current_url, final_goal=self.final_goal, actions_taken=get_actions_taken_with_thoughts(self.actions_taken))
+        """
+        elements, elements_hidden = self.ranker.select(current_page_elements, self.objective, self.final_goal, state)
+        model = self.available_model[1]
+        human = self._build_prompt(
+            human_template, model, fixed=system, actions=self.actions_taken,
+            elements=elements, elements_hidden=elements_hidden,
+            current_url=current_url, final_goal=self.final_goal
+        )
 
         chat = []
         chat.append({
@@ -163,19 +221,93 @@ class PragyaGPT:
 
         self.history.extend(chat)  # Add chat to history
 
-        chat_completion = self.client.chat.completions.create(
+        return dict(
             messages=chat,
-            model=self.available_model[1],
+            model=model,
             temperature=1,
-            stream=False,
             top_p=1,
             max_tokens=self.max_tokens,
             stop=None,
         )
 
-        return chat_completion.choices[0].message.content
+    def _next_action(self, objective, current_url, current_page_elements, error=None, on_command=None):
+        """
+        Ask for the next action, going up the model cascade until a reply is
+        taken. In streaming mode `on_command(command)` is called as soon as
+        the command of the reply is complete (and taken). In observe-and-act
+        mode the reply also holds the `observation` of the page.
+        """
+        element_ids = self._element_ids(current_page_elements)
+        state = state_fingerprint(current_url, current_page_elements)
+        tier = self._first_tier(error)
+
+        print("Chat completion start....")
+
+        while True:
+            request = self._next_action_request(objective, current_url, current_page_elements, error,
+                                                self._tier_model(tier), state)
+            with span(self._action_span, model=request["model"], stream=self.stream, tier=tier):
+                started = time.perf_counter()
+                streamed = command_error = None
+                if self.stream:
+                    response, streamed, command_error = self._stream_reply(
+                        request, on_command, element_ids, self._cascade_gate(tier, state))
+                else:
+                    response = self._complete(**request)
+                next_step = self._cascade_action(tier, response, element_ids, state, streamed, started)
+            if next_step is not None:
+                break
+            tier += 1
+
+        print("Chat completion end....")
+
+        self._remember_action(next_step, "NEXT ACTION RESPONSE")
+        if command_error is not None:
+            raise command_error
+        return next_step
+
+    @property
+    def _action_span(self):
+        return "llm.observe_and_act" if self.observe_and_act else "llm.next_action"
 
-    def _next_action(self, objective, current_url, current_page_elements, error=None):
+    def _first_tier(self, error):
+        return self.cascade.first_tier(error) if self.cascade is not None else 0
+
+    def _tier_model(self, tier):
+        return self.cascade.models[tier] if self.cascade is not None else self.model
+
+    def _cascade_gate(self, tier, state):
+        """Whether a streamed command may be executed before the reply is reviewed."""
+        if self.cascade is None or self.cascade.is_last(tier):
+            return None
+        return lambda command: self.cascade.review(tier, command, state) is None
+
+    def _cascade_action(self, tier, response, element_ids, state, streamed, started):
+        """
+        Parse the reply of `tier`, None when the step goes to the next tier
+        instead. A reply whose command was `streamed` (already executed) is
+        always taken.
+        """
+        if self.cascade is None:
+            return self._parse_reply(response, element_ids, streamed)
+        last = self.cascade.is_last(tier)
+        try:
+            next_step = self._parse_reply(response, element_ids, streamed)
+        except ActionParseError:
+            self.cascade.record(tier, time.perf_counter() - started, "invalid", failed=last)
+            if last:
+                raise
+            reason = "invalid"
+        else:
+            reason = None if streamed is not None else self.cascade.review(tier, next_step["command"], state)
+            self.cascade.record(tier, time.perf_counter() - started, reason)
+        if reason is None:
+            return next_step
+        current_span().set(escalated=reason)
+        print(f"Escalating the next action to {self.cascade.models[tier + 1]} ({reason})")
+        return None
+
+    def _next_action_request(self, objective, current_url, current_page_elements, error=None, model=None, state=None):
         system = """ROLE: "Human like robot browsing the web."
 
         GOAL: "Give next action with your thoughts needed to perform in browser."
@@ -188,12 +320,22 @@ class PragyaGPT:
 
         with open("action_history.json", "w") as f:
             json.dump(self.history, f, indent=4)
-        description_prompt = NEXT_STEP_ACTION_DESCRIPTION_PROMPT.format(
-            objective=objective, final_goal=self.final_goal, actions_taken=get_actions_taken(self.actions_taken), observation=self.temp_objective, current_url=current_url, current_page_elements=current_page_elements, error=error)
+        elements, elements_hidden = self.ranker.select(current_page_elements, objective, self.final_goal, state)
+        model = model or self.model
+        if self.observe_and_act:
+            description_template, goal_prompt = OBSERVE_AND_ACT_DESCRIPTION_PROMPT, OBSERVE_AND_ACT_GOAL_PROMPT
+        else:
+            description_template, goal_prompt = NEXT_STEP_ACTION_DESCRIPTION_PROMPT, NEXT_STEP_ACTION_GOAL_PROMPT
+        description_prompt = self._build_prompt(
+            description_template, model, fixed=system + goal_prompt,
+            actions=self.actions_taken, observation=self.temp_objective,
+            elements=elements, elements_hidden=elements_hidden,
+            objective=objective, final_goal=self.final_goal, current_url=current_url, error=error
+        )
         human = """{description_prompt}
 
         {NEXT_STEP_ACTION_GOAL_PROMPT}
-        """.format(description_prompt=description_prompt, NEXT_STEP_ACTION_GOAL_PROMPT=NEXT_STEP_ACTION_GOAL_PROMPT)
+        """.format(description_prompt=description_prompt, NEXT_STEP_ACTION_GOAL_PROMPT=goal_prompt)
 
         chat = []
         chat.append({
@@ -207,13 +349,10 @@ class PragyaGPT:
 
         self.history.extend(chat)  # Add chat to history
 
-        print("Chat completion start....")
-
-        chat_completion = self.client.chat.completions.create(
+        return dict(
             messages=chat,
-            model=self.available_model[0],
+            model=model,
             temperature=1,
-            stream=False,
             top_p=1,
             stop=None,
             max_tokens=self.max_tokens,
@@ -221,11 +360,159 @@ class PragyaGPT:
             response_format={"type": "json_object"},
         )
 
-        print("Chat completion end....")
+    def _build_prompt(self, template, model, **kwargs):
+        """Fill `template` for `model` within the prompt budget and report the tokens used."""
+        element_format = element_format_for(model, self.element_format)
+        with span("prompt.build", model=model, element_format=element_format) as trace:
+            prompt, report = self.prompt_builder.build(template, element_format=element_format, **kwargs)
+            trace.set(prompt_tokens=report["total"], elements_shown=report["elements_shown"],
+                      elements_total=report["elements_total"])
+        self.last_prompt_report = report
+        print("Prompt tokens: " + ", ".join(f"{name}={value}" for name, value in report.items()))
+        return prompt
+
+    def _complete(self, messages, **params):
+        """Send `messages` to the LLM and return the content of the reply."""
+        key = self._cache_key(messages, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                return cached
+
+        completion = self.provider.complete(messages, **params)
+        response = completion.content
+        self._record_usage(completion.usage)
+
+        if key is not None:
+            self.cache.put(key, response, model=params.get("model"))
+        return response
+
+    def _stream_action(self, request, on_command, title, element_ids=None):
+        """
+        Stream an action reply, calling `on_command` with the command as soon
+        as it is complete and valid. An error raised by `on_command` is raised
+        once the reply is recorded, so the history stays complete.
+        """
+        response, streamed, command_error = self._stream_reply(request, on_command, element_ids)
+        json_response = self._remember_action(self._parse_reply(response, element_ids, streamed), title)
+        if command_error is not None:
+            raise command_error
+        return json_response
 
-        response = chat_completion.choices[0].message.content
-        json_response = parse_json_garbage(response)
-        print("\nNEXT ACTION RESPONSE:\n")
+    def _stream_reply(self, request, on_command, element_ids=None, gate=None):
+        """
+        Stream a reply, handing its command to `on_command` as soon as it is
+        complete, valid and let through by `gate`. Returns the reply, the
+        command handed out (None if none) and the error `on_command` raised.
+        """
+        parser = StreamingJSONParser()
+        streamed = command_error = None
+        for chunk in self._complete_stream(**self._stream_request(request)):
+            self._trace_chunk(parser)
+            for command in self._streamed_commands(parser, chunk, element_ids):
+                if streamed is not None or (gate is not None and not gate(command)):
+                    continue
+                self._trace_command()
+                streamed = command
+                if on_command is not None:
+                    try:
+                        on_command(command)
+                    except Exception as e:
+                        command_error = e
+        return parser.text, streamed, command_error
+
+    def _streamed_commands(self, parser, chunk, element_ids):
+        """Valid commands completed by `chunk`; invalid ones are reported by the full parse."""
+        commands = []
+        for key, value in parser.feed(chunk):
+            if key == "command":
+                try:
+                    commands.append(normalize_command(value, element_ids))
+                except ActionParseError:
+                    pass
+        return commands
+
+    def _record_usage(self, usage):
+        """Count a request and its tokens, also on the current LLM span."""
+        self.usage["requests"] += 1
+        if usage is not None:
+            self.usage["prompt_tokens"] += usage["prompt_tokens"]
+            self.usage["completion_tokens"] += usage["completion_tokens"]
+            current_span().set(**usage)
+
+    @staticmethod
+    def _trace_chunk(parser):
+        """Time to first token of a streamed reply, before `parser` is fed the first chunk."""
+        if not parser.text:
+            trace = current_span()
+            trace.event("first_token")
+            trace.set(ttft_ms=round(trace.elapsed_ms(), 1))
+
+    @staticmethod
+    def _trace_command():
+        """When the command of a streamed reply was complete, long before the reply."""
+        trace = current_span()
+        trace.event("command")
+        trace.set(command_ms=round(trace.elapsed_ms(), 1))
+
+    @staticmethod
+    def _element_ids(elements):
+        return {element["id"] for element in elements if "id" in element}
+
+    def _stream_request(self, request):
+        # JSON mode is not available with streaming, the prompt asks for JSON anyway
+        return {name: value for name, value in request.items() if name != "response_format"}
+
+    def _complete_stream(self, messages, **params):
+        """Yield the reply to `messages` chunk by chunk (cached replies in one chunk)."""
+        key = self._cache_key(messages, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                current_span().set(cached=True)
+                yield cached
+                return
+
+        chunks = []
+        stream = self.provider.stream(messages, **params)
+        for content in stream:
+            chunks.append(content)
+            yield content
+        self._record_usage(stream.usage)
+
+        if key is not None:
+            self.cache.put(key, "".join(chunks), model=params.get("model"))
+
+    def _cache_key(self, messages, params):
+        return LLMCache.key(messages, **params) if self.cache is not None else None
+
+    def _record_action(self, response, title, element_ids=None):
+        """
+        Parse an action reply and add it to the history and taken actions.
+
+        Raises `ActionParseError` when the reply cannot be used as an action,
+        its message tells the LLM what to fix on the next try.
+        """
+        return self._remember_action(parse_action(response, element_ids), title)
+
+    @staticmethod
+    def _parse_reply(response, element_ids=None, streamed=None):
+        """
+        Parse an action reply. When its command was `streamed` (already
+        executed) and the full reply is not valid, the executed command is
+        the action taken, so that the history shows what was done on the page.
+        """
+        try:
+            return parse_action(response, element_ids)
+        except ActionParseError:
+            if streamed is None:
+                raise
+            return {"command": streamed, "thoughts": {"text": "", "reasoning": ""}}
+
+    def _remember_action(self, json_response, title):
+        """Add a parsed action reply to the history and taken actions."""
+        print(f"\n{title}:\n")
         print(json.dumps(json_response, indent=4))
         print("\n")
 
@@ -236,5 +523,7 @@ class PragyaGPT:
             }
         )  # Add assistant response to history
         self.actions_taken.append(json_response)
+        if "observation" in json_response:
+            self.temp_objective = json_response["observation"]
 
         return json_response
@@ -1,15 +1,20 @@
+from agent.registry import ACTIONS
+
+# The action lists are generated from the registry the agents execute from
+FIRST_STEP_ACTIONS = ACTIONS.prompt_list([
+    "_google_search", "_go_to_url", "_click", "_type", "_scroll_up", "_scroll_down", "_wait", "_go_back",
+    "_set_goal_achieved",
+], notes=False)
+
+NEXT_STEP_ACTIONS = ACTIONS.prompt_list([
+    "_click", "_type", "_scroll_up", "_scroll_down", "_wait", "_go_back", "_set_goal_achieved", "_google_search",
+    "_go_to_url",
+])
+
 FIRST_STEP_ACTION_DESCRIPTION_PROMPT = """You are given the following objective: "{objective}" and the following final goal needs to be achieved: "{final_goal}".
 
 You can use the following actions which will help you to control the browser:
-1. _google_search(text)
-2. _go_to_url(url)
-3. _click(id)
-4. _type(id, text)
-5. _scroll_up()
-6. _scroll_down()
-7. _wait()
-8. _go_back()
-9. _set_goal_achieved()
+""" + FIRST_STEP_ACTIONS + """
 
 ERROR:
 {error}
@@ -19,19 +24,19 @@ ERROR:
 
 FIRST_STEP_ACTION_GOAL_PROMPT = """What will be your next action ensuring the a solid start? Please choose only ONE action at a time. Answer with a JSON with the below form which can be loaded with Python `json.loads`. Example:
 {
+    "command": {
+        "action": "_selected_action_name",
+        "args": ["arg1", "arg2"]
+    },
     "thoughts": {
         "text": "<your thought>",
         "reasoning": "<your reasoning>"
-    },
-    "command": {
-        "action": "_selected_action_name",
-        "args": ["arg1", "arg2"],
     }
 }
 
 REMEMBER:
 - You should provide thoughts and reasoning for your action.
-- Your response should be in JSON format with the above structure.
+- Your response should be in JSON format with the above structure, with the "command" first.
 - Use the action `_set_goal_achieved()` only when the final goal is achieved, not before that.
 - Don't give more arguments than the action can take.
 - Don't choose any other actions other than the ones mentioned above.
@@ -45,15 +50,7 @@ You have taken the following actions so far. Try not to repeat yourself unless n
 {actions_taken}
 
 You can use the following actions which will help you to control the browser:
-1. _click(id)
-2. _type(id, text)
-3. _scroll_up()
-4. _scroll_down() # To see more content
-5. _wait()
-6. _go_back()
-7. _set_goal_achieved() # ONLY USE THIS ACTION WHEN THE FINAL GOAL IS ACHIEVED
-8. _google_search(text) # ONLY USE IF ALL THE ABOVE ACTIONS ARE NOT APPLICABLE
-9. _go_to_url(url)
+""" + NEXT_STEP_ACTIONS + """
 
 Observation of the current page:
 {observation}
@@ -71,19 +68,67 @@ ERROR (try to give response avoiding this error):
 
 NEXT_STEP_ACTION_GOAL_PROMPT = """What will be your next action ensuring the final goal is achieved? Please choose only ONE action at a time. Answer with a JSON with the below form which can be loaded with Python `json.loads`. Example:
 {
+    "command": {
+        "action": "_selected_action_name",
+        "args": ["arg1", "arg2"]
+    },
     "thoughts": {
         "text": "<your thought>",
         "reasoning": "<your reasoning>"
-    },
+    }
+}
+
+Your response must obey the following constraints:
+- You should provide thoughts and reasoning for your action.
+- Your response should be in JSON format with the above structure, with the "command" first.
+- Try not to repeat yourself unless necessary.
+- Use the action `_set_goal_achieved()` only when the final goal is achieved, not before that.
+- Don't give more arguments than the action can take.
+- Don't choose any other actions other than the ones mentioned above.
+- Only select that element which will help you to achieve the final goal most possibly in whole list.
+
+TIPS:
+- When you are clicking on an element, make sure that element text or label or ariaLabel or placeholder contains any words of the final goal or objective the most!
+"""
+
+
+# Observe-and-act mode: one call observes the page and decides the next action
+OBSERVE_AND_ACT_DESCRIPTION_PROMPT = """You are given the following objective: "{objective}" and the following final goal needs to be achieved: "{final_goal}".
+
+You have taken the following actions so far. Try not to repeat yourself unless necessary.
+{actions_taken}
+
+You can use the following actions which will help you to control the browser:
+""" + NEXT_STEP_ACTIONS + """
+
+Current URL: {current_url}
+
+Current Page Elements(every element is clickable): 
+{current_page_elements}
+The format of the browser content is highly simplified; all formatting elements are stripped.
+When choosing elements, please use the `id` number.
+
+ERROR (try to give response avoiding this error):
+{error}
+"""
+
+OBSERVE_AND_ACT_GOAL_PROMPT = """First observe the current page, then decide your next action ensuring the final goal is achieved. Please choose only ONE action at a time. Answer with a JSON with the below form which can be loaded with Python `json.loads`. Example:
+{
+    "observation": "<where we are and whether the actions taken bring us closer to the final goal>",
     "command": {
         "action": "_selected_action_name",
-        "args": ["arg1", "arg2"],
+        "args": ["arg1", "arg2"]
+    },
+    "thoughts": {
+        "text": "<your thought>",
+        "reasoning": "<your reasoning>"
     }
 }
 
 Your response must obey the following constraints:
+- Keep the observation very short, simple and precise: one or two sentences about the current page.
 - You should provide thoughts and reasoning for your action.
-- Your response should be in JSON format with the above structure.
+- Your response should be in JSON format with the above structure, with the "observation" first and the "command" right after it.
 - Try not to repeat yourself unless necessary.
 - Use the action `_set_goal_achieved()` only when the final goal is achieved, not before that.
 - Don't give more arguments than the action can take.
@@ -93,4 +138,3 @@ Your response must obey the following constraints:
 TIPS:
 - When you are clicking on an element, make sure that element text or label or ariaLabel or placeholder contains any words of the final goal or objective the most!
 """
-
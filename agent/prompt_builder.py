@@ -0,0 +1,179 @@
+"""
+Token-budgeted prompt construction.
+
+The prompts carry the taken actions, the last observation and the page
+elements, all of which grow with the run. `PromptBuilder` counts tokens
+locally and fits those sections into a per-call budget: the most recent
+actions are kept verbatim, older ones are compacted into a rolling summary,
+and the observation and element list are cut only when that is not enough.
+"""
+import re
+import math
+from agent.element_format import ELEMENT_FORMATS
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to an estimate
+    _encoding = None
+
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """
+    Number of tokens in `text`.
+
+    Uses tiktoken when it is installed, otherwise a close estimate: one token
+    per punctuation mark and one per ~4 characters of every word.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut `text` so that it fits in `max_tokens`."""
+    if max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / tokens)
+    while cut > 0 and count_tokens(text[:cut]) > max_tokens:
+        cut = int(cut * 0.9)
+    return text[:cut] + " ..."
+
+
+def describe_action(action, with_thoughts=False):
+    """One line for an action reply, e.g. `- _type with args [3, 'cats']`."""
+    command = action.get("command", {}) if isinstance(action, dict) else {}
+    line = "- " + str(command.get("action", "?"))
+    if command.get("args"):
+        line += " with args " + str(command["args"])
+    if with_thoughts and isinstance(action.get("thoughts"), dict) and action["thoughts"].get("text"):
+        line += " with thoughts " + str(action["thoughts"]["text"])
+    return line
+
+
+class PromptBuilder:
+    """
+    Fill a prompt template while keeping it under `budget` tokens.
+
+    The template may use `{actions_taken}`, `{observation}` and
+    `{current_page_elements}`; every other placeholder is filled verbatim from
+    the keyword arguments of `build`.
+    """
+
+    def __init__(self, budget=6000, recent_actions=3, observation_tokens=300, element_format="repr"):
+        self.budget = budget
+        self.recent_actions = recent_actions
+        self.observation_tokens = observation_tokens
+        self.element_format = element_format
+
+    def render_actions(self, actions, recent=None, compact=False):
+        """
+        The most recent `recent` actions verbatim (with thoughts), the older
+        ones as one line each, or only as counts per action when `compact`.
+        """
+        if not actions:
+            return "None."
+        recent = self.recent_actions if recent is None else recent
+        older = actions[:-recent] if recent else actions
+        latest = actions[-recent:] if recent else []
+
+        lines = []
+        if older:
+            if compact:
+                counts = {}
+                for action in older:
+                    name = describe_action(action)[2:].split(" ")[0]
+                    counts[name] = counts.get(name, 0) + 1
+                summary = ", ".join(f"{name} x{count}" for name, count in counts.items())
+                lines.append(f"- {len(older)} earlier actions ({summary})")
+            else:
+                lines.extend(describe_action(action) for action in older)
+        lines.extend(describe_action(action, with_thoughts=True) for action in latest)
+        return "\n".join(lines)
+
+    def render_elements(self, elements, limit=None, hidden=0, element_format=None):
+        """Format the elements, noting how many (plus `hidden` ones) are left out."""
+        shown = elements if limit is None else elements[:limit]
+        text = ELEMENT_FORMATS[element_format or self.element_format](shown)
+        not_shown = hidden + len(elements) - len(shown)
+        if not_shown:
+            text += f"\n(... {not_shown} more elements available but not shown, less related to the goal)"
+        return text
+
+    def build(self, template, fixed="", actions=None, observation=None, elements=None, elements_hidden=0,
+              element_format=None, **fields):
+        """
+        Return the filled template and a report of the tokens used per section.
+
+        `fixed` is any other text sent along with this prompt (system prompt,
+        instructions) so that it counts towards the budget too.
+        `elements_hidden` is the number of elements already pruned before.
+        `element_format` overrides the element encoding for this prompt.
+        """
+        element_format = element_format or self.element_format
+        uses = lambda name: "{" + name + "}" in template
+        actions = actions or []
+        elements = elements if elements is not None else []
+        render_elements = lambda limit=None: self.render_elements(elements, limit, elements_hidden, element_format)
+        observation = "None." if observation is None else str(observation)
+
+        sections = {
+            "actions_taken": self.render_actions(actions) if uses("actions_taken") else "",
+            "observation": observation if uses("observation") else "",
+            "current_page_elements": render_elements() if uses("current_page_elements") else "",
+        }
+        base_tokens = count_tokens(fixed) + count_tokens(
+            template.format(**{**fields, "actions_taken": "", "observation": "", "current_page_elements": ""})
+        )
+        tokens = lambda: base_tokens + sum(count_tokens(text) for text in sections.values())
+
+        shown_elements = len(elements)
+        recent = self.recent_actions
+        # Shrink the least useful parts first until the prompt fits
+        if tokens() > self.budget and uses("actions_taken"):
+            sections["actions_taken"] = self.render_actions(actions, compact=True)
+        if tokens() > self.budget and uses("actions_taken"):
+            recent = min(recent, 1)
+            sections["actions_taken"] = self.render_actions(actions, recent=recent, compact=True)
+        if tokens() > self.budget and uses("observation"):
+            sections["observation"] = truncate_to_tokens(observation, self.observation_tokens)
+        if tokens() > self.budget and uses("current_page_elements"):
+            available = self.budget - (tokens() - count_tokens(sections["current_page_elements"]))
+            low, high = 0, len(elements)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if count_tokens(render_elements(middle)) <= available:
+                    low = middle
+                else:
+                    high = middle - 1
+            shown_elements = low
+            sections["current_page_elements"] = render_elements(low)
+
+        text = template.format(**fields, **sections)
+        report = {
+            "fixed": base_tokens,
+            "actions_taken": count_tokens(sections["actions_taken"]),
+            "observation": count_tokens(sections["observation"]),
+            "current_page_elements": count_tokens(sections["current_page_elements"]),
+            "total": tokens(),
+            "budget": self.budget,
+            "elements_shown": shown_elements,
+            "elements_total": len(elements) + elements_hidden,
+            "actions_verbatim": min(len(actions), recent),
+            "actions_summarized": max(0, len(actions) - recent),
+            "element_format": element_format,
+        }
+        if element_format != "repr" and uses("current_page_elements"):
+            # What the same elements would have cost with the original encoding
+            repr_tokens = count_tokens(self.render_elements(elements, shown_elements, elements_hidden, "repr"))
+            report["elements_repr"] = repr_tokens
+            report["elements_saved"] = repr_tokens - report["current_page_elements"]
+        return text, report
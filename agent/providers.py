@@ -0,0 +1,384 @@
+"""
+LLM providers.
+
+`PragyaGPT` talks to the LLM through a provider. `complete` returns a
+`Completion` (the content and the token usage), `stream` a `CompletionStream`
+that yields the content chunk by chunk and holds the usage once exhausted;
+`acomplete` / `astream` are the same for the asyncio agents.
+
+    GroqProvider              the Groq API, through the groq SDK
+    OpenAICompatibleProvider  any OpenAI-compatible endpoint (a vLLM or
+                              llama.cpp server, benchmarks/stub_llm.py...)
+
+All providers of a process share one pooled keep-alive HTTP client (one per
+event loop for the async calls), so sessions reuse warm connections instead
+of opening one each. Failed requests raise `ProviderError`.
+
+Configured through the environment:
+    PRAGYA_LLM_PROVIDER=groq|openai   (default groq)
+    PRAGYA_LLM_BASE_URL=...           (default: the provider's own; groq also reads GROQ_BASE_URL)
+    PRAGYA_LLM_API_KEY=...            (default: GROQ_API_KEY / OPENAI_API_KEY)
+    PRAGYA_LLM_TIMEOUT=60             (seconds to wait for a reply)
+    PRAGYA_LLM_CONNECT_TIMEOUT=5      (seconds to connect)
+    PRAGYA_LLM_MAX_CONNECTIONS=20     (size of the shared connection pool)
+"""
+import os
+import json
+import asyncio
+import threading
+import weakref
+
+import httpx
+
+
+class ProviderError(Exception):
+    """
+    A request to the LLM failed. `status_code` is None when no response came
+    back (connection error, timeout); `retry_after` is the delay in seconds
+    the API asked for, if any.
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class Completion:
+    """The reply to a chat completion request."""
+
+    def __init__(self, content, usage=None):
+        self.content = content
+        self.usage = usage
+
+
+class CompletionStream:
+    """
+    Iterate over the content chunks of a streamed reply; `usage` is set
+    once the stream is exhausted, when the API reports it.
+    """
+
+    def __init__(self, events):
+        # (content, usage) pairs, either may be None
+        self._events = events
+        self.usage = None
+
+    def __iter__(self):
+        for content, usage in self._events:
+            if usage is not None:
+                self.usage = usage
+            if content:
+                yield content
+
+
+class AsyncCompletionStream(CompletionStream):
+    """`CompletionStream` of the async calls, iterate it with `async for`."""
+
+    def __iter__(self):
+        raise TypeError("iterate an AsyncCompletionStream with `async for`")
+
+    async def __aiter__(self):
+        async for content, usage in self._events:
+            if usage is not None:
+                self.usage = usage
+            if content:
+                yield content
+
+
+def usage_dict(usage):
+    """Token counts of an API usage block (object or dict), None when there is none."""
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = {name: getattr(usage, name, None) for name in ("prompt_tokens", "completion_tokens")}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+    }
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+#  S H A R E D   H T T P   C L I E N T S
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _client_options(timeout, connect_timeout, max_connections):
+    return dict(
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+
+def shared_http_client(timeout=60.0, connect_timeout=5.0, max_connections=20):
+    """The pooled `httpx.Client` of this process for these settings."""
+    key = (timeout, connect_timeout, max_connections)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = _clients[key] = httpx.Client(**_client_options(*key))
+        return client
+
+
+def shared_async_http_client(timeout=60.0, connect_timeout=5.0, max_connections=20):
+    """The pooled `httpx.AsyncClient` of the running event loop for these settings."""
+    # Async connections belong to the event loop that opened them
+    loop = asyncio.get_running_loop()
+    key = (timeout, connect_timeout, max_connections)
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None or client.is_closed:
+            client = clients[key] = httpx.AsyncClient(**_client_options(*key))
+        return client
+
+
+#  P R O V I D E R S
+
+class LLMProvider:
+    """Base of the providers: connection settings and the shared clients."""
+
+    name = None
+
+    def __init__(self, api_key=None, base_url=None, timeout=60.0, connect_timeout=5.0, max_connections=20):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+
+    def http_client(self):
+        return shared_http_client(self.timeout, self.connect_timeout, self.max_connections)
+
+    def async_http_client(self):
+        return shared_async_http_client(self.timeout, self.connect_timeout, self.max_connections)
+
+    def complete(self, messages, **params):
+        raise NotImplementedError
+
+    def stream(self, messages, **params):
+        raise NotImplementedError
+
+    async def acomplete(self, messages, **params):
+        raise NotImplementedError
+
+    def astream(self, messages, **params):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.base_url or 'default endpoint'})"
+
+
+class GroqProvider(LLMProvider):
+    """The Groq API through the groq SDK, on the shared HTTP clients."""
+
+    name = "groq"
+
+    def __init__(self, *args, max_retries=0, **kwargs):
+        # Retries and backoff are left to agent.scheduler, which sees every session
+        super().__init__(*args, **kwargs)
+        self.max_retries = max_retries
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _sdk_options(self):
+        return dict(
+            api_key=self.api_key or os.environ.get("GROQ_API_KEY"),
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            max_retries=self.max_retries,
+        )
+
+    @property
+    def client(self):
+        from groq import Groq
+
+        if self._client is None:
+            self._client = Groq(http_client=self.http_client(), **self._sdk_options())
+        return self._client
+
+    @property
+    def async_client(self):
+        from groq import AsyncGroq
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = AsyncGroq(http_client=self.async_http_client(), **self._sdk_options())
+        return client
+
+    @staticmethod
+    def _error(e):
+        import groq
+
+        if isinstance(e, groq.APIStatusError):
+            return ProviderError(str(e), e.status_code, _retry_after(e.response.headers))
+        return ProviderError(str(e))
+
+    @staticmethod
+    def _chunk_event(chunk):
+        content = chunk.choices[0].delta.content if chunk.choices else None
+        # Groq reports the usage of a stream in the x_groq block of the last chunk
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+        return content, usage_dict(usage)
+
+    def complete(self, messages, **params):
+        import groq
+
+        try:
+            response = self.client.chat.completions.create(messages=messages, stream=False, **params)
+        except groq.APIError as e:
+            raise self._error(e) from e
+        return Completion(response.choices[0].message.content, usage_dict(response.usage))
+
+    def stream(self, messages, **params):
+        return CompletionStream(self._stream_events(messages, params))
+
+    def _stream_events(self, messages, params):
+        import groq
+
+        try:
+            for chunk in self.client.chat.completions.create(messages=messages, stream=True, **params):
+                yield self._chunk_event(chunk)
+        except groq.APIError as e:
+            raise self._error(e) from e
+
+    async def acomplete(self, messages, **params):
+        import groq
+
+        try:
+            response = await self.async_client.chat.completions.create(messages=messages, stream=False, **params)
+        except groq.APIError as e:
+            raise self._error(e) from e
+        return Completion(response.choices[0].message.content, usage_dict(response.usage))
+
+    def astream(self, messages, **params):
+        return AsyncCompletionStream(self._astream_events(messages, params))
+
+    async def _astream_events(self, messages, params):
+        import groq
+
+        try:
+            async for chunk in await self.async_client.chat.completions.create(messages=messages, stream=True, **params):
+                yield self._chunk_event(chunk)
+        except groq.APIError as e:
+            raise self._error(e) from e
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any OpenAI-compatible chat completions endpoint, over the shared HTTP clients."""
+
+    name = "openai"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.base_url = (self.base_url or "https://api.openai.com/v1").rstrip("/")
+
+    def _request(self, messages, params, stream):
+        body = dict(params, messages=messages, stream=stream)
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        headers = {}
+        api_key = self.api_key or os.environ.get("OPENAI_API_KEY")
+        if api_key:
+            headers["Authorization"] = "Bearer " + api_key
+        return dict(url=self.base_url + "/chat/completions", json=body, headers=headers)
+
+    @staticmethod
+    def _check(response, text):
+        if response.status_code >= 400:
+            raise ProviderError(
+                f"HTTP {response.status_code} from the LLM: {text[:500]}",
+                response.status_code, _retry_after(response.headers),
+            )
+
+    @staticmethod
+    def _completion(payload):
+        return Completion(payload["choices"][0]["message"]["content"], usage_dict(payload.get("usage")))
+
+    @staticmethod
+    def _line_event(line):
+        """(content, usage) of a server-sent event line, None for the other lines."""
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+        chunk = json.loads(data)
+        choices = chunk.get("choices") or []
+        content = (choices[0].get("delta") or {}).get("content") if choices else None
+        return content, usage_dict(chunk.get("usage"))
+
+    def complete(self, messages, **params):
+        try:
+            response = self.http_client().post(**self._request(messages, params, stream=False))
+        except httpx.HTTPError as e:
+            raise ProviderError(str(e)) from e
+        self._check(response, response.text)
+        return self._completion(response.json())
+
+    def stream(self, messages, **params):
+        return CompletionStream(self._stream_events(messages, params))
+
+    def _stream_events(self, messages, params):
+        try:
+            with self.http_client().stream("POST", **self._request(messages, params, stream=True)) as response:
+                if response.status_code >= 400:
+                    self._check(response, response.read().decode("utf-8", "replace"))
+                for line in response.iter_lines():
+                    event = self._line_event(line)
+                    if event is not None:
+                        yield event
+        except httpx.HTTPError as e:
+            raise ProviderError(str(e)) from e
+
+    async def acomplete(self, messages, **params):
+        try:
+            response = await self.async_http_client().post(**self._request(messages, params, stream=False))
+        except httpx.HTTPError as e:
+            raise ProviderError(str(e)) from e
+        self._check(response, response.text)
+        return self._completion(response.json())
+
+    def astream(self, messages, **params):
+        return AsyncCompletionStream(self._astream_events(messages, params))
+
+    async def _astream_events(self, messages, params):
+        try:
+            async with self.async_http_client().stream("POST", **self._request(messages, params, stream=True)) as response:
+                if response.status_code >= 400:
+                    self._check(response, (await response.aread()).decode("utf-8", "replace"))
+                async for line in response.aiter_lines():
+                    event = self._line_event(line)
+                    if event is not None:
+                        yield event
+        except httpx.HTTPError as e:
+            raise ProviderError(str(e)) from e
+
+
+PROVIDERS = {
+    GroqProvider.name: GroqProvider,
+    OpenAICompatibleProvider.name: OpenAICompatibleProvider,
+}
+
+
+def provider_from_env():
+    """Build the provider configured by the PRAGYA_LLM_* environment variables."""
+    name = os.environ.get("PRAGYA_LLM_PROVIDER", "groq").lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown LLM provider {name!r}, expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name](
+        api_key=os.environ.get("PRAGYA_LLM_API_KEY"),
+        base_url=os.environ.get("PRAGYA_LLM_BASE_URL"),
+        timeout=float(os.environ.get("PRAGYA_LLM_TIMEOUT", 60)),
+        connect_timeout=float(os.environ.get("PRAGYA_LLM_CONNECT_TIMEOUT", 5)),
+        max_connections=int(os.environ.get("PRAGYA_LLM_MAX_CONNECTIONS", 20)),
+    )
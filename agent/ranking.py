@@ -0,0 +1,115 @@
+"""
+Objective-relevance ranking of page elements.
+
+Large pages have hundreds of links, most of them unrelated to the objective.
+`ElementRanker` scores every element's text, ariaLabel, placeholder and label
+against the objective and the final goal with BM25 (vectorized with NumPy)
+and keeps only the top-K, so the prompt stays small. Elements keep their
+`id`, so the choice of the LLM still maps back to the extracted element.
+"""
+import re
+import numpy as np
+
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "go", "how",
+    "i", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "our", "that", "the",
+    "their", "then", "there", "this", "to", "user", "wants", "we", "what", "which", "will",
+    "with", "you", "your", "goal", "final", "step", "steps", "browser", "achieve", "possible",
+}
+
+ELEMENT_FIELDS = ("text", "ariaLabel", "placeholder", "label")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase words without stopwords, with a naive plural folding."""
+    tokens = []
+    for token in _TOKEN_RE.findall(str(text).lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class ElementRanker:
+    """
+    Keep the `top_k` elements most related to the objective.
+
+    Objective terms weigh `objective_weight` times more than final goal terms.
+    Elements with a placeholder (text inputs) get a small bonus, since a
+    search box is often the way forward even when nothing matches yet. When
+    fewer than `top_k` elements match, the rest is filled in page order.
+    """
+
+    def __init__(self, top_k=40, k1=1.2, b=0.75, objective_weight=2.0, input_bonus=0.5):
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self.objective_weight = objective_weight
+        self.input_bonus = input_bonus
+        # Query and page state of the last selection, and the selection
+        self._last = None
+
+    def scores(self, elements, objective, final_goal=None):
+        """BM25 score of every element against the query."""
+        weights = {}
+        for token in tokenize(final_goal or ""):
+            weights[token] = weights.get(token, 0) + 1.0
+        for token in tokenize(objective or ""):
+            weights[token] = weights.get(token, 0) + self.objective_weight
+        if not elements:
+            return np.zeros(0)
+
+        terms = list(weights)
+        index = {term: j for j, term in enumerate(terms)}
+        tf = np.zeros((len(elements), len(terms)))
+        lengths = np.zeros(len(elements))
+        for i, element in enumerate(elements):
+            tokens = tokenize(" ".join(str(element.get(field, "")) for field in ELEMENT_FIELDS))
+            lengths[i] = len(tokens)
+            for token in tokens:
+                j = index.get(token)
+                if j is not None:
+                    tf[i, j] += 1
+
+        scores = np.zeros(len(elements))
+        if terms:
+            df = (tf > 0).sum(axis=0)
+            idf = np.log(1 + (len(elements) - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+            bm25 = tf * (self.k1 + 1) / (tf + norm[:, None])
+            scores = bm25 @ (idf * np.array([weights[term] for term in terms]))
+
+        has_input = np.array([bool(element.get("placeholder")) for element in elements])
+        return scores + self.input_bonus * has_input
+
+    def select(self, elements, objective, final_goal=None, state=None):
+        """
+        Return the selected elements in page order and how many were left out.
+
+        `state` is the fingerprint of the page (see agent.fingerprint); the
+        last selection is reused when it is the same page and query.
+        """
+        if self.top_k is None or len(elements) <= self.top_k:
+            return list(elements), 0
+        key = (state, objective, final_goal)
+        if state is not None and self._last is not None and self._last[0] == key:
+            selected, left_out = self._last[1]
+            return list(selected), left_out
+
+        scores = self.scores(elements, objective, final_goal)
+        ranked = np.argsort(-scores, kind="stable")
+        matching = [i for i in ranked[:self.top_k] if scores[i] > 0]
+        chosen = set(matching)
+        for i in range(len(elements)):
+            if len(chosen) >= self.top_k:
+                break
+            chosen.add(i)
+
+        selected = [elements[i] for i in sorted(chosen)]
+        self._last = (key, (selected, len(elements) - len(selected)))
+        return list(selected), len(elements) - len(selected)
@@ -0,0 +1,202 @@
+"""
+Registry of the browser actions.
+
+Every action the LLM may choose is declared once in `ACTIONS`, with its
+arguments and the note shown next to it in the prompts. The same
+declarations are used to:
+
+- generate the action lists of `agent/prompt.py`,
+- validate and coerce the arguments of LLM replies (`agent/output.py`),
+- check that `ActionAgent` / `AsyncActionAgent` implement every action with
+  a matching signature (`@ACTIONS.implements`, at import time),
+- dispatch `execute` through a table of bound methods built once per agent.
+"""
+import re
+import inspect
+
+
+class ActionError(ValueError):
+    """Raised for an unknown action or invalid action arguments."""
+
+
+class Arg:
+    """
+    An action argument. `kind` is "id" (a page element, given by the LLM as
+    its id and executed on its in-page handle or xpath), "text" or "number".
+    """
+
+    KINDS = ("id", "text", "number")
+
+    def __init__(self, name, kind="text", required=True):
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown argument kind {kind!r}, expected one of {self.KINDS}")
+        self.name = name
+        self.kind = kind
+        self.required = required
+
+    def __repr__(self):
+        return f"Arg({self.name!r}, {self.kind!r}{'' if self.required else ', required=False'})"
+
+
+class ActionSpec:
+    def __init__(self, name, args=(), note=None):
+        self.name = name
+        self.args = tuple(args)
+        self.note = note
+
+    @property
+    def required(self):
+        return sum(1 for arg in self.args if arg.required)
+
+    def signature(self):
+        """`_type(id, text)`, as written in the prompts (optional arguments left out)."""
+        return "{}({})".format(self.name, ", ".join(arg.name for arg in self.args if arg.required))
+
+    def __repr__(self):
+        return f"ActionSpec({self.signature()})"
+
+
+_ID_RE = re.compile(r"-?\d+")
+
+
+class ActionRegistry:
+    def __init__(self):
+        self.specs = {}
+
+    def register(self, name, *args, note=None):
+        self.specs[name] = ActionSpec(name, args, note)
+        return self.specs[name]
+
+    def __contains__(self, name):
+        return name in self.specs
+
+    def __iter__(self):
+        return iter(self.specs.values())
+
+    def get(self, name):
+        spec = self.specs.get(name)
+        if spec is None:
+            raise ActionError(f"unknown action {name!r}, choose one of: {', '.join(self.specs)}")
+        return spec
+
+    def implements(self, method):
+        """
+        Decorator for the action methods of an agent: fails at import when the
+        method does not match its declaration, so the prompts cannot drift
+        from what the agents execute.
+        """
+        spec = self.get(method.__name__)
+        params = list(inspect.signature(method).parameters.values())[1:]  # Without self
+        names = [param.name for param in params]
+        required = sum(1 for param in params if param.default is inspect.Parameter.empty)
+        if len(names) != len(spec.args) or required != spec.required:
+            raise TypeError(f"{method.__qualname__}{tuple(names)} does not match the declared {spec.signature()}")
+        method.action_spec = spec
+        return method
+
+    def bind(self, agent):
+        """Table of action name to bound method of `agent`, built once per agent."""
+        table = {}
+        for name in self.specs:
+            method = getattr(agent, name, None)
+            if method is None or getattr(method, "action_spec", None) is None:
+                raise TypeError(f"{type(agent).__name__} does not implement the action {name}")
+            table[name] = method
+        return table
+
+    def coerce(self, name, args, element_ids=None):
+        """
+        Validate the arguments given by the LLM: element ids become ints (and
+        must be in `element_ids` when given), extra arguments are dropped.
+        """
+        spec = self.get(name)
+        if len(args) < spec.required:
+            raise ActionError(f"{spec.signature()} needs {spec.required} argument(s), got {len(args)}")
+        return [self._coerce(spec, arg, value, element_ids) for arg, value in zip(spec.args, args)]
+
+    def check(self, name, args):
+        """
+        Validate the arguments of an action about to be executed, where
+        elements are already resolved to a reference or an xpath.
+        """
+        spec = self.get(name)
+        if not spec.required <= len(args) <= len(spec.args):
+            expected = str(spec.required) if spec.required == len(spec.args) else f"{spec.required} to {len(spec.args)}"
+            raise ActionError(f"{spec.signature()} takes {expected} argument(s), got {len(args)}")
+        coerced = []
+        for arg, value in zip(spec.args, args):
+            if arg.kind == "id":
+                # An element id, an element reference (helpers.element_ref) or an xpath
+                if isinstance(value, dict) and "path" in value:
+                    pass
+                elif not isinstance(value, (int, str)) or isinstance(value, bool):
+                    raise ActionError(f"the {arg.name} of {name} must be an element, got {value!r}")
+                coerced.append(value)
+            else:
+                coerced.append(self._coerce(spec, arg, value))
+        return coerced
+
+    def prompt_list(self, names=None, notes=True):
+        """The numbered action list of the prompts, in the order of `names`."""
+        specs = [self.get(name) for name in names] if names else list(self)
+        lines = []
+        for i, spec in enumerate(specs, 1):
+            line = f"{i}. {spec.signature()}"
+            if notes and spec.note:
+                line += f" # {spec.note}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _coerce(self, spec, arg, value, element_ids=None):
+        if arg.kind == "id":
+            if isinstance(value, bool):
+                value = None
+            elif isinstance(value, (int, float)):
+                value = int(value)
+            else:
+                match = _ID_RE.search(str(value))
+                value = int(match.group()) if match else None
+            if value is None:
+                raise ActionError(f"the {arg.name} of {spec.name} must be the element id number")
+            if element_ids is not None and value not in element_ids:
+                raise ActionError(f"there is no element with id {value} on the current page")
+            return value
+        if arg.kind == "number":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                raise ActionError(f"the {arg.name} of {spec.name} must be a number") from None
+        if isinstance(value, (dict, list)):
+            raise ActionError(f"the {arg.name} of {spec.name} must be a string")
+        return str(value)
+
+
+class ActionStats:
+    """Number of calls, failures and time spent per action."""
+
+    def __init__(self):
+        self.actions = {}
+
+    def record(self, name, seconds, ok=True):
+        entry = self.actions.setdefault(name, {"calls": 0, "errors": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        entry["errors"] += 0 if ok else 1
+        entry["seconds"] += seconds
+
+    def summary(self):
+        return {
+            name: {**entry, "mean_seconds": entry["seconds"] / entry["calls"]}
+            for name, entry in self.actions.items()
+        }
+
+
+ACTIONS = ActionRegistry()
+ACTIONS.register("_google_search", Arg("text"), note="ONLY USE IF ALL THE ABOVE ACTIONS ARE NOT APPLICABLE")
+ACTIONS.register("_go_to_url", Arg("url"))
+ACTIONS.register("_click", Arg("id", "id"))
+ACTIONS.register("_type", Arg("id", "id"), Arg("text"))
+ACTIONS.register("_scroll_up")
+ACTIONS.register("_scroll_down", note="To see more content")
+ACTIONS.register("_wait", Arg("sec", "number", required=False))
+ACTIONS.register("_go_back")
+ACTIONS.register("_set_goal_achieved", note="ONLY USE THIS ACTION WHEN THE FINAL GOAL IS ACHIEVED")
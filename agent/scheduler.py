@@ -0,0 +1,404 @@
+"""
+Rate-limit aware scheduling of LLM requests.
+
+Every session of the process sends its requests through the same
+`RateLimitScheduler`, which keeps a request bucket and a token bucket per
+model (the requests/min and tokens/min quotas of the API) and hands out the
+quota in priority order: sessions with a lower `priority` number go first,
+in arrival order within a priority. Requests wait in the queue instead of
+hitting the API and failing.
+
+The tokens of a request are estimated up front and corrected with the usage
+of the reply. When the API still answers 429, the whole model backs off (not
+only the failing session, so that they do not all retry together), for the
+delay the server asked for or an exponential one, with jitter. Server errors
+and dropped connections are retried the same way, other errors are raised.
+
+`ScheduledProvider` puts a provider of `agent.providers` behind the
+scheduler. Limits come from `DEFAULT_LIMITS` and the environment:
+    PRAGYA_LLM_LIMITS="llama3-8b-8192=30/30000,llama3-70b-8192=30/6000"
+    (model=requests per minute/tokens per minute; 0 means no limit,
+    PRAGYA_LLM_LIMITS=off drops every limit, e.g. for a local endpoint)
+"""
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+
+from agent.providers import ProviderError, CompletionStream, AsyncCompletionStream
+from agent.tracing import current_span
+
+# Requests and tokens per minute of the Groq models (free tier)
+DEFAULT_LIMITS = {
+    "llama3-8b-8192": (30, 30000),
+    "llama3-70b-8192": (30, 6000),
+    "llama2-70b-4096": (30, 15000),
+    "mixtral-8x7b-32768": (30, 5000),
+    "gemma-7b-it": (30, 15000),
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# "Please try again in 1m2.5s" in the error messages of Groq
+_TRY_AGAIN = re.compile(r"try again in (?:(\d+)m)?(\d+(?:\.\d+)?)(ms|s)")
+
+
+def estimate_tokens(messages, params):
+    """Rough token count of a request: ~4 characters a token, plus room for the reply."""
+    prompt = sum(len(str(message.get("content", ""))) for message in messages) // 4
+    return prompt + min(params.get("max_tokens") or 512, 512)
+
+
+def retry_hint(error):
+    """Seconds the API asked to wait before retrying, None when it did not say."""
+    if error.retry_after is not None:
+        return error.retry_after
+    match = _TRY_AGAIN.search(str(error))
+    if match is None:
+        return None
+    minutes, amount, unit = match.groups()
+    seconds = float(amount) / (1000 if unit == "ms" else 1)
+    return int(minutes or 0) * 60 + seconds
+
+
+def parse_limits(text):
+    """Parse PRAGYA_LLM_LIMITS, "model=rpm/tpm,..."."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        model, _, quota = entry.partition("=")
+        requests, _, tokens = quota.partition("/")
+        limits[model.strip()] = (int(requests or 0), int(tokens or 0))
+    return limits
+
+
+class TokenBucket:
+    """Refills at `per_minute` a minute, up to a minute worth of quota."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` is available (more than the capacity counts as all of it)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount, now):
+        """Take `amount`, a negative amount gives back; the level may go below zero."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+    def drain(self, now):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class _Ticket:
+    __slots__ = ("priority", "sequence", "model", "tokens", "queued", "granted", "cancelled")
+
+    def __init__(self, priority, sequence, model, tokens):
+        self.priority = priority
+        self.sequence = sequence
+        self.model = model
+        self.tokens = tokens
+        self.queued = time.monotonic()
+        self.granted = None
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class _ModelQueue:
+    def __init__(self, limits):
+        requests, tokens = limits or (0, 0)
+        self.requests = TokenBucket(requests) if requests else None
+        self.tokens = TokenBucket(tokens) if tokens else None
+        self.waiting = []
+        self.blocked_until = 0.0
+        self.stats = {
+            "granted": 0, "max_depth": 0, "rate_limited": 0, "retries": 0, "failures": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+        }
+        self.waits = []
+
+    def wait_time(self, ticket, now):
+        wait = max(0.0, self.blocked_until - now)
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(ticket.tokens, now))
+        return wait
+
+
+class RateLimitScheduler:
+    """
+    Process-wide queue of LLM requests, see the module docstring. Sync
+    sessions use `acquire` / `run`, asyncio sessions `acquire_async` /
+    `run_async`; both wait in the same queues.
+    """
+
+    def __init__(self, limits=None, max_retries=6, base_backoff=1.0, max_backoff=60.0):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._queues = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Condition()
+
+    def _queue(self, model):
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.limits.get(model))
+        return queue
+
+    def _enqueue(self, model, tokens, priority):
+        with self._lock:
+            queue = self._queue(model)
+            ticket = _Ticket(priority, next(self._sequence), model, tokens)
+            heapq.heappush(queue.waiting, ticket)
+            queue.stats["max_depth"] = max(queue.stats["max_depth"], len(queue.waiting))
+            return ticket
+
+    def _try_grant(self, ticket):
+        """Grant `ticket` if it is first in line and the quota allows, else return the seconds to wait."""
+        with self._lock:
+            queue = self._queue(ticket.model)
+            while queue.waiting and queue.waiting[0].cancelled:
+                heapq.heappop(queue.waiting)
+            now = time.monotonic()
+            if queue.waiting[0] is not ticket:
+                # Woken up when the head is granted
+                return 0.05
+            wait = queue.wait_time(ticket, now)
+            if wait > 0:
+                return wait
+            heapq.heappop(queue.waiting)
+            if queue.requests is not None:
+                queue.requests.take(1, now)
+            if queue.tokens is not None:
+                queue.tokens.take(ticket.tokens, now)
+            ticket.granted = now
+            queue.stats["granted"] += 1
+            queue.waits.append(now - ticket.queued)
+            del queue.waits[:-1000]
+            self._lock.notify_all()
+            return 0.0
+
+    def _cancel(self, ticket):
+        with self._lock:
+            ticket.cancelled = True
+            self._lock.notify_all()
+
+    def acquire(self, model, tokens, priority=0):
+        """Block until a request of `tokens` estimated tokens may be sent."""
+        ticket = self._enqueue(model, tokens, priority)
+        try:
+            while True:
+                wait = self._try_grant(ticket)
+                if not wait:
+                    return ticket
+                with self._lock:
+                    self._lock.wait(timeout=wait)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    async def acquire_async(self, model, tokens, priority=0):
+        ticket = self._enqueue(model, tokens, priority)
+        try:
+            while True:
+                wait = self._try_grant(ticket)
+                if not wait:
+                    return ticket
+                await asyncio.sleep(min(wait, 0.05))
+        except BaseException:
+            self._cancel(ticket)
+            raise
+
+    def release(self, ticket, usage=None):
+        """Correct the token estimate of a granted request with its actual `usage`."""
+        with self._lock:
+            queue = self._queue(ticket.model)
+            if usage is None:
+                return
+            queue.stats["prompt_tokens"] += usage["prompt_tokens"]
+            queue.stats["completion_tokens"] += usage["completion_tokens"]
+            if queue.tokens is not None:
+                used = usage["prompt_tokens"] + usage["completion_tokens"]
+                queue.tokens.take(used - ticket.tokens, time.monotonic())
+
+    def retry_delay(self, ticket, error, attempt):
+        """
+        Seconds to wait before retrying after `error`, None when it must be
+        raised. A 429 holds back every request of the model for that time.
+        """
+        with self._lock:
+            queue = self._queue(ticket.model)
+            if error.status_code == 429:
+                queue.stats["rate_limited"] += 1
+            if (error.status_code is not None and error.status_code not in RETRY_STATUSES) \
+                    or attempt >= self.max_retries:
+                queue.stats["failures"] += 1
+                return None
+            queue.stats["retries"] += 1
+            hint = retry_hint(error)
+            if hint is not None:
+                delay = hint + random.uniform(0, min(1.0, hint * 0.2 + 0.1))
+            else:
+                delay = random.uniform(self.base_backoff / 2, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+            if error.status_code == 429:
+                now = time.monotonic()
+                queue.blocked_until = max(queue.blocked_until, now + delay)
+                # Our estimate was off, the quota is used up
+                for bucket in (queue.requests, queue.tokens):
+                    if bucket is not None:
+                        bucket.drain(now)
+                self._lock.notify_all()
+            return delay
+
+    def metrics(self):
+        """Queue depth, waits, rate limiting and tokens per model."""
+        with self._lock:
+            metrics = {}
+            for model, queue in self._queues.items():
+                waits = sorted(queue.waits)
+                metrics[model] = dict(
+                    queue.stats,
+                    queued=sum(1 for ticket in queue.waiting if not ticket.cancelled),
+                    wait_p50_ms=round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                    wait_p95_ms=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                    wait_max_ms=round(waits[-1] * 1000, 1) if waits else 0.0,
+                )
+            return metrics
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """The scheduler shared by every session of the process."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            configured = os.environ.get("PRAGYA_LLM_LIMITS", "")
+            limits = {} if configured.strip().lower() == "off" else dict(DEFAULT_LIMITS, **parse_limits(configured))
+            _default_scheduler = RateLimitScheduler(limits)
+        return _default_scheduler
+
+
+class ScheduledProvider:
+    """A provider whose requests wait for their turn in `scheduler` and are retried on 429."""
+
+    def __init__(self, provider, scheduler=None, priority=0):
+        self.provider = provider
+        self.scheduler = scheduler if scheduler is not None else default_scheduler()
+        self.priority = priority
+
+    @staticmethod
+    def _traced(ticket, attempt, queued_ms):
+        """Time queued so far (over the retries too), on the current LLM span."""
+        queued_ms += (ticket.granted - ticket.queued) * 1000
+        current_span().set(queue_ms=round(queued_ms, 1), retries=attempt)
+        return queued_ms
+
+    def complete(self, messages, **params):
+        model, tokens = params.get("model"), estimate_tokens(messages, params)
+        queued_ms = 0.0
+        for attempt in itertools.count():
+            ticket = self.scheduler.acquire(model, tokens, self.priority)
+            queued_ms = self._traced(ticket, attempt, queued_ms)
+            try:
+                completion = self.provider.complete(messages, **params)
+            except ProviderError as e:
+                delay = self.scheduler.retry_delay(ticket, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.scheduler.release(ticket, completion.usage)
+            return completion
+
+    def stream(self, messages, **params):
+        return CompletionStream(self._stream_events(messages, params))
+
+    def _stream_events(self, messages, params):
+        model, tokens = params.get("model"), estimate_tokens(messages, params)
+        queued_ms = 0.0
+        for attempt in itertools.count():
+            ticket = self.scheduler.acquire(model, tokens, self.priority)
+            queued_ms = self._traced(ticket, attempt, queued_ms)
+            stream = self.provider.stream(messages, **params)
+            started = False
+            try:
+                for content in stream:
+                    started = True
+                    yield content, None
+            except ProviderError as e:
+                # Part of the reply is out already, it cannot be asked again
+                delay = None if started else self.scheduler.retry_delay(ticket, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.scheduler.release(ticket, stream.usage)
+            yield None, stream.usage
+            return
+
+    async def acomplete(self, messages, **params):
+        model, tokens = params.get("model"), estimate_tokens(messages, params)
+        queued_ms = 0.0
+        for attempt in itertools.count():
+            ticket = await self.scheduler.acquire_async(model, tokens, self.priority)
+            queued_ms = self._traced(ticket, attempt, queued_ms)
+            try:
+                completion = await self.provider.acomplete(messages, **params)
+            except ProviderError as e:
+                delay = self.scheduler.retry_delay(ticket, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.release(ticket, completion.usage)
+            return completion
+
+    def astream(self, messages, **params):
+        return AsyncCompletionStream(self._astream_events(messages, params))
+
+    async def _astream_events(self, messages, params):
+        model, tokens = params.get("model"), estimate_tokens(messages, params)
+        queued_ms = 0.0
+        for attempt in itertools.count():
+            ticket = await self.scheduler.acquire_async(model, tokens, self.priority)
+            queued_ms = self._traced(ticket, attempt, queued_ms)
+            stream = self.provider.astream(messages, **params)
+            started = False
+            try:
+                async for content in stream:
+                    started = True
+                    yield content, None
+            except ProviderError as e:
+                delay = None if started else self.scheduler.retry_delay(ticket, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.scheduler.release(ticket, stream.usage)
+            yield None, stream.usage
+            return
+
+    def __repr__(self):
+        return f"ScheduledProvider({self.provider!r}, priority={self.priority})"
@@ -0,0 +1,159 @@
+"""
+Adaptive page-settle detection.
+
+Instead of sleeping a fixed time or waiting only for `domcontentloaded`, the
+agents wait until the page is actually stable: no network request in flight
+for `quiet_ms` and no DOM mutation for `quiet_ms`, with `timeout_ms` as a
+ceiling. A simple click settles in a few hundred milliseconds, a single page
+app that renders after its XHRs is waited for until it is done. Every settle
+is recorded, so the time spent waiting per step can be reported.
+
+`SettleDetector` is for `playwright.sync_api`, `AsyncSettleDetector` for
+`playwright.async_api`.
+"""
+import time
+import asyncio
+from helpers import load_js
+from agent.tracing import current_span, span
+
+# Long-lived connections never finish, they must not keep the page busy
+IGNORED_RESOURCE_TYPES = ("websocket", "eventsource")
+
+# Pause before checking again a document that was being replaced, the longest
+# poll interval of the DOM quiet check (js/settle.js)
+RETRY_POLL_MS = 50
+
+
+class _SettleBase:
+    def __init__(self, page, quiet_ms=400, timeout_ms=10000, long_request_ms=5000):
+        """
+        `quiet_ms` is how long the network and the DOM must stay quiet,
+        `timeout_ms` the ceiling of a settle. Requests pending for more than
+        `long_request_ms` (long polling, streaming) are not waited for.
+        """
+        self.page = page
+        self.quiet_ms = quiet_ms
+        self.timeout_ms = timeout_ms
+        self.long_request_ms = long_request_ms
+
+        self._inflight = {}
+        self._last_network = time.monotonic()
+        self.history = []
+
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+        page.on("framenavigated", self._on_navigated)
+
+    def _on_request(self, request):
+        if request.resource_type in IGNORED_RESOURCE_TYPES:
+            return
+        self._inflight[request] = time.monotonic()
+        self._last_network = time.monotonic()
+
+    def _on_request_done(self, request):
+        if self._inflight.pop(request, None) is not None:
+            self._last_network = time.monotonic()
+
+    def _on_navigated(self, frame):
+        if frame == self.page.main_frame:
+            # Requests of the previous document never report back
+            self._inflight.clear()
+            self._last_network = time.monotonic()
+
+    def _network_quiet(self, now):
+        """Seconds left until the network counts as quiet, 0 when it is."""
+        pending = [
+            started for started in self._inflight.values()
+            if now - started < self.long_request_ms / 1000
+        ]
+        if pending:
+            return self.quiet_ms / 1000
+        return max(0.0, self.quiet_ms / 1000 - (now - self._last_network))
+
+    def _record(self, started, settled):
+        seconds = time.monotonic() - started
+        self.history.append({"seconds": seconds, "settled": settled})
+        current_span().set(settled=settled)
+        return seconds
+
+    def summary(self):
+        """Number of settles, time spent waiting and how many hit the ceiling."""
+        durations = sorted(entry["seconds"] for entry in self.history)
+        if not durations:
+            return {"settles": 0}
+        return {
+            "settles": len(durations),
+            "total_seconds": sum(durations),
+            "mean_seconds": sum(durations) / len(durations),
+            "p95_seconds": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "timeouts": sum(1 for entry in self.history if not entry["settled"]),
+        }
+
+
+class SettleDetector(_SettleBase):
+    def wait(self, timeout_ms=None):
+        """
+        Block until the page is stable or `timeout_ms` (default `self.timeout_ms`)
+        passed. Returns the seconds waited.
+        """
+        with span("settle", url=self.page.url):
+            return self._wait(timeout_ms)
+
+    def _wait(self, timeout_ms):
+        started = time.monotonic()
+        deadline = started + (timeout_ms or self.timeout_ms) / 1000
+        settled = False
+        while True:
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            if remaining_ms <= 0:
+                break
+            try:
+                self.page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+                dom_quiet = self.page.evaluate(load_js("settle.js"), [self.quiet_ms, remaining_ms])
+            except Exception:
+                if self.page.is_closed():
+                    break
+                # The document was replaced while waiting, settle the new one
+                self.page.wait_for_timeout(min(RETRY_POLL_MS, max(remaining_ms, 0)))
+                continue
+            if not dom_quiet:
+                break
+            network_wait = self._network_quiet(time.monotonic())
+            if not network_wait:
+                settled = True
+                break
+            # Waiting through playwright lets it deliver the request events
+            self.page.wait_for_timeout(min(network_wait * 1000, max(remaining_ms, 0)))
+        return self._record(started, settled)
+
+
+class AsyncSettleDetector(_SettleBase):
+    async def wait(self, timeout_ms=None):
+        with span("settle", url=self.page.url):
+            return await self._wait(timeout_ms)
+
+    async def _wait(self, timeout_ms):
+        started = time.monotonic()
+        deadline = started + (timeout_ms or self.timeout_ms) / 1000
+        settled = False
+        while True:
+            remaining_ms = (deadline - time.monotonic()) * 1000
+            if remaining_ms <= 0:
+                break
+            try:
+                await self.page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+                dom_quiet = await self.page.evaluate(load_js("settle.js"), [self.quiet_ms, remaining_ms])
+            except Exception:
+                if self.page.is_closed():
+                    break
+                await asyncio.sleep(min(RETRY_POLL_MS, max(remaining_ms, 0)) / 1000)
+                continue
+            if not dom_quiet:
+                break
+            network_wait = self._network_quiet(time.monotonic())
+            if not network_wait:
+                settled = True
+                break
+            await asyncio.sleep(min(network_wait, max(remaining_ms, 0) / 1000))
+        return self._record(started, settled)
@@ -0,0 +1,237 @@
+"""
+Incremental page snapshots.
+
+The extractor in `js/mark_page.js` keeps a MutationObserver on the page and,
+on every `pragyaSnapshot()` call, only re-probes the subtrees that changed
+since the previous call. This module keeps the Python mirror of that snapshot
+and applies the element-level diffs it returns.
+"""
+import time
+import weakref
+from helpers import evaluate_extractor, evaluate_extractor_async, clean_elements
+from agent.tracing import span
+
+
+SNAPSHOT_CALL = """options => window.pragyaSnapshot ? pragyaSnapshot(options) : null"""
+IS_DIRTY_CALL = """() => window.pragyaIsDirty ? pragyaIsDirty() : true"""
+
+
+class SnapshotDiff:
+    """
+    Difference between two consecutive snapshots of the same page.
+
+    `added` and `changed` hold element dicts, `removed` holds uids. `full` is
+    set when the whole element list was (re)sent, e.g. after a navigation.
+    """
+
+    def __init__(self, version, full=False, added=None, removed=None, changed=None):
+        self.version = version
+        self.full = full
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+
+    def is_empty(self):
+        return not (self.added or self.removed or self.changed)
+
+    def __repr__(self):
+        return "SnapshotDiff(v{}{}: +{} -{} ~{})".format(
+            self.version, " full" if self.full else "",
+            len(self.added), len(self.removed), len(self.changed)
+        )
+
+
+class PageSnapshot:
+    """
+    The clickable elements of a page at a given point in time.
+
+    A snapshot is shared by everything that looks at the same page state (the
+    observation and the next-action prompt) and is only replaced once the page
+    has navigated, an action was executed or the DOM changed.
+    """
+
+    def __init__(self, url, document_id, version, elements, diff):
+        self.url = url
+        self.document_id = document_id
+        self.version = version
+        self.elements = elements
+        self.diff = diff
+
+        self._clean_elements = None
+
+    @property
+    def clean_elements(self):
+        """The elements that carry some text, see `helpers.clean_elements`."""
+        if self._clean_elements is None:
+            with span("extract.clean", elements=len(self.elements)) as trace:
+                self._clean_elements = clean_elements(self.elements, self.document_id)
+                trace.set(clean_elements=len(self._clean_elements))
+        return self._clean_elements
+
+    def __repr__(self):
+        return "PageSnapshot(v{}, {} elements, {})".format(self.version, len(self.elements), self.url)
+
+
+class SnapshotEngine:
+    """
+    Keeps an up-to-date list of the clickable elements of a page.
+
+    `elements` has the same shape as the output of `markPage()` plus a `uid`
+    that is stable for as long as the element stays in the document.
+    """
+
+    def __init__(self, page, lazy=False):
+        self.page = page
+        self.lazy = lazy
+
+        self.document_id = None
+        self.version = None
+        self.elements = []
+        self.last_diff = None
+        self.snapshot = None
+
+        self._by_uid = {}
+        self._stale = True
+
+        page.on("framenavigated", self._on_frame_navigated)
+
+    def detach(self):
+        """Stop following the navigations of the page."""
+        self.page.remove_listener("framenavigated", self._on_frame_navigated)
+
+    def _on_frame_navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.invalidate()
+
+    def invalidate(self):
+        """Mark the current snapshot as outdated, e.g. after an action."""
+        self._stale = True
+
+    def current(self):
+        """
+        Return the snapshot of the current page state.
+
+        The previous snapshot is reused as long as there was no navigation, no
+        action and no DOM mutation since it was taken; checking the latter only
+        costs a tiny round trip instead of an extraction.
+        """
+        if self.snapshot is not None and not self._stale:
+            if self.page.url == self.snapshot.url and not self.page.evaluate(IS_DIRTY_CALL):
+                return self.snapshot
+        self.refresh()
+        return self.snapshot
+
+    def refresh(self, full=False):
+        """Bring the mirror up to date and return what changed."""
+        with span("extract", url=self.page.url, lazy=self.lazy) as trace:
+            started = time.perf_counter()
+            result = evaluate_extractor(self.page, SNAPSHOT_CALL, {
+                "lazy": self.lazy,
+                "full": full,
+                "base": self.version,
+            })
+            return self._traced_apply(trace, result, started)
+
+    def _traced_apply(self, trace, result, started):
+        """`_apply` the result, splitting the extraction time into JS, transfer and Python."""
+        evaluated = time.perf_counter()
+        diff = self._apply(result)
+        js_ms = result.get("elapsedMs", 0.0)
+        trace.set(
+            js_ms=round(js_ms, 1),
+            transfer_ms=round(max(0.0, (evaluated - started) * 1000 - js_ms), 1),
+            python_ms=round((time.perf_counter() - evaluated) * 1000, 1),
+            elements=len(self.elements),
+            full=diff.full,
+        )
+        return diff
+
+    def _apply(self, result):
+        new_document = result["documentId"] != self.document_id
+        full = result["full"] or new_document
+
+        if full:
+            # Everything was resent: diff it against our own mirror instead
+            previous = {} if new_document else self._by_uid
+            by_uid = {element["uid"]: element for element in result["added"]}
+            added = [element for uid, element in by_uid.items() if uid not in previous]
+            changed = [
+                element for uid, element in by_uid.items()
+                if uid in previous and previous[uid] != element
+            ]
+            removed = [uid for uid in self._by_uid if new_document or uid not in by_uid]
+        else:
+            by_uid = dict(self._by_uid)
+            for uid in result["removed"]:
+                by_uid.pop(uid, None)
+            for element in result["added"] + result["changed"]:
+                by_uid[element["uid"]] = element
+            added, removed, changed = result["added"], result["removed"], result["changed"]
+
+        self._by_uid = by_uid
+        self.elements = [by_uid[uid] for uid in result["order"]]
+        self.document_id = result["documentId"]
+        self.version = result["version"]
+        self.last_diff = SnapshotDiff(self.version, full, added, removed, changed)
+
+        url = self.page.url
+        if self.snapshot is None or not self.last_diff.is_empty() or url != self.snapshot.url:
+            self.snapshot = PageSnapshot(url, self.document_id, self.version, self.elements, self.last_diff)
+        self._stale = False
+        return self.last_diff
+
+
+class AsyncSnapshotEngine(SnapshotEngine):
+    """`SnapshotEngine` for `playwright.async_api` pages."""
+
+    async def current(self):
+        if self.snapshot is not None and not self._stale:
+            if self.page.url == self.snapshot.url and not await self.page.evaluate(IS_DIRTY_CALL):
+                return self.snapshot
+        await self.refresh()
+        return self.snapshot
+
+    async def refresh(self, full=False):
+        with span("extract", url=self.page.url, lazy=self.lazy) as trace:
+            started = time.perf_counter()
+            result = await evaluate_extractor_async(self.page, SNAPSHOT_CALL, {
+                "lazy": self.lazy,
+                "full": full,
+                "base": self.version,
+            })
+            return self._traced_apply(trace, result, started)
+
+
+# The engines hold their page, so an entry is dropped when its page closes
+_engines = weakref.WeakKeyDictionary()
+
+
+def _forget_engine(page):
+    engine = _engines.pop(page, None)
+    if engine is not None:
+        engine.detach()
+
+
+def invalidate_snapshot(page):
+    """Invalidate the snapshot of `page`, if any engine is tracking it."""
+    engine = _engines.get(page)
+    if engine is not None:
+        engine.invalidate()
+
+
+def get_snapshot_engine(page, lazy=False, engine_class=SnapshotEngine):
+    """Return the snapshot engine of `page`, creating it on first use."""
+    engine = _engines.get(page)
+    if engine is None or engine.lazy != lazy or not isinstance(engine, engine_class):
+        if engine is None:
+            page.once("close", _forget_engine)
+        else:
+            engine.detach()
+        engine = engine_class(page, lazy=lazy)
+        _engines[page] = engine
+    return engine
+
+
+def get_async_snapshot_engine(page, lazy=False):
+    """`get_snapshot_engine` for `playwright.async_api` pages."""
+    return get_snapshot_engine(page, lazy=lazy, engine_class=AsyncSnapshotEngine)
@@ -0,0 +1,95 @@
+"""
+Incremental parsing of streamed JSON replies.
+
+The action replies are one JSON object with a `command` and a `thoughts`
+member. `StreamingJSONParser` is fed the reply chunk by chunk as the LLM
+writes it and hands out every top-level member as soon as its value is
+complete, so the command can be executed while the thoughts are still being
+generated.
+"""
+import json
+from agent.output import parse_json
+
+
+def loads_lenient(text):
+    """`json.loads` that repairs objects and arrays, see `agent.output.parse_json`."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return parse_json(text)
+
+
+class StreamingJSONParser:
+    """
+    Find the top-level members of a JSON object while it is being received.
+
+    `feed` returns the `(key, value)` pairs completed by the new chunk. Text
+    before the opening brace (code fences, chatter) is skipped, and a member
+    whose value cannot be decoded is skipped too: the full reply is still
+    parsed as a whole at the end.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.members = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._key = None
+        self._expect_key = False
+        self._value_start = None
+        self.done = False
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = text[self._string_start:self._pos + 1]
+                        self._expect_key = False
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._string_start = self._pos
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    if char == "[":  # Not an object, nothing to hand out early
+                        self.done = True
+                    self._expect_key = True
+            elif char in "}]":
+                if self._depth == 1:
+                    self._complete_member(text, self._pos, completed)
+                    self.done = True
+                self._depth -= 1
+            elif self._depth == 1:
+                if char == ":" and self._key is not None:
+                    self._value_start = self._pos + 1
+                elif char == ",":
+                    self._complete_member(text, self._pos, completed)
+                    self._expect_key = True
+            self._pos += 1
+        return completed
+
+    def _complete_member(self, text, end, completed):
+        if self._key is None or self._value_start is None:
+            return
+        raw_value = text[self._value_start:end].strip()
+        key, self._key, self._value_start = self._key, None, None
+        try:
+            key, value = json.loads(key), loads_lenient(raw_value)
+        except (json.JSONDecodeError, ValueError):
+            return
+        self.members[key] = value
+        completed.append((key, value))
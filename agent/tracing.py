@@ -0,0 +1,236 @@
+"""
+Per-step latency tracing.
+
+A `Tracer` collects nested spans (run > step > extraction, prompt build, LLM
+request, action, page settle) with their attributes (URL, element count,
+prompt tokens...). The code under trace only opens spans with `span(...)`,
+which does nothing unless a tracer was activated for the current thread or
+asyncio task, so the agents work the same without one.
+
+Spans are exported as JSONL (one span per line) or in the Chrome trace event
+format (open it in chrome://tracing or https://ui.perfetto.dev), and
+`Tracer.summary()` tells where the time of a run went.
+"""
+import os
+import json
+import time
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+
+_tracer = contextvars.ContextVar("pragya_tracer", default=None)
+_current_span = contextvars.ContextVar("pragya_span", default=None)
+
+
+class Span:
+    """A timed section of a run. Times are seconds since the tracer started."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attributes", "events", "thread_id", "_clock")
+
+    def __init__(self, name, span_id, parent_id, start, attributes, clock):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = start
+        self.end = None
+        self.attributes = attributes
+        self.events = []
+        self.thread_id = threading.get_ident()
+        self._clock = clock
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else self.start) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name, at=None):
+        """Mark a point in the span, e.g. the first token of a reply."""
+        self.events.append((name, at if at is not None else self._clock()))
+
+    def elapsed_ms(self):
+        """Milliseconds since the span started."""
+        return (self._clock() - self.start) * 1000
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "start_ms": round(self.start * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "events": [{"name": name, "at_ms": round(at * 1000, 3)} for name, at in self.events],
+        }
+
+
+class _NoSpan:
+    """What `span` yields when tracing is off: attributes go nowhere."""
+
+    def set(self, **attributes):
+        pass
+
+    def event(self, name, at=None):
+        pass
+
+    def elapsed_ms(self):
+        return 0.0
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    def __init__(self, name="run"):
+        self.name = name
+        self.spans = []
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def now(self):
+        """Seconds since the tracer started, the clock of the spans."""
+        return time.perf_counter() - self._origin
+
+    @contextmanager
+    def activate(self, **attributes):
+        """Trace the current thread or task under a root span named after the tracer."""
+        token = _tracer.set(self)
+        try:
+            with span(self.name, **attributes) as root:
+                yield root
+        finally:
+            _tracer.reset(token)
+
+    def _open(self, name, parent, attributes):
+        with self._lock:
+            opened = Span(name, next(self._ids), parent.span_id if parent else None, self.now(), attributes, self.now)
+            self.spans.append(opened)
+        return opened
+
+    def export_jsonl(self, path):
+        with open(path, "w") as f:
+            for traced in self.spans:
+                f.write(json.dumps(traced.to_dict(), default=str) + "\n")
+
+    def export_chrome_trace(self, path):
+        """Write the spans as complete ("X") events, and their events as instants."""
+        pid = os.getpid()
+        events = []
+        for traced in self.spans:
+            events.append({
+                "name": traced.name,
+                "cat": "pragya",
+                "ph": "X",
+                "ts": round(traced.start * 1e6, 1),
+                "dur": round(traced.duration * 1e6, 1),
+                "pid": pid,
+                "tid": traced.thread_id,
+                "args": traced.attributes,
+            })
+            for name, at in traced.events:
+                events.append({
+                    "name": name,
+                    "cat": "pragya",
+                    "ph": "i",
+                    "s": "t",
+                    "ts": round(at * 1e6, 1),
+                    "pid": pid,
+                    "tid": traced.thread_id,
+                })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+
+    def export(self, prefix):
+        """Write `<prefix>.jsonl` and `<prefix>.trace.json`, return their paths."""
+        paths = (prefix + ".jsonl", prefix + ".trace.json")
+        self.export_jsonl(paths[0])
+        self.export_chrome_trace(paths[1])
+        return paths
+
+    def summary(self):
+        """
+        Time per span name: count, total, own time (outside child spans),
+        mean and max in ms, share of the run, and the totals of numeric `*_ms` attributes (e.g. the JS and
+        transfer time of extractions).
+        """
+        roots = [traced for traced in self.spans if traced.parent_id is None]
+        run_seconds = sum(traced.duration for traced in roots)
+        in_children = {}
+        for traced in self.spans:
+            if traced.parent_id is not None:
+                in_children[traced.parent_id] = in_children.get(traced.parent_id, 0.0) + traced.duration
+        by_name = {}
+        for traced in self.spans:
+            if traced.parent_id is None:
+                continue
+            entry = by_name.setdefault(traced.name, {"count": 0, "total_ms": 0.0, "self_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += traced.duration * 1000
+            # Time not spent in child spans (children of async tasks can outlive their parent)
+            entry["self_ms"] += max(0.0, traced.duration - in_children.get(traced.span_id, 0.0)) * 1000
+            entry["max_ms"] = max(entry["max_ms"], traced.duration * 1000)
+            for key, value in traced.attributes.items():
+                if key.endswith("_ms") and isinstance(value, (int, float)):
+                    entry[key] = entry.get(key, 0.0) + value
+        for entry in by_name.values():
+            entry["mean_ms"] = entry["total_ms"] / entry["count"]
+            entry["share"] = entry["total_ms"] / (run_seconds * 1000) if run_seconds else 0.0
+            for key, value in entry.items():
+                if isinstance(value, float):
+                    entry[key] = round(value, 3 if key == "share" else 1)
+        return {
+            "run_ms": round(run_seconds * 1000, 1),
+            "spans": dict(sorted(by_name.items(), key=lambda item: -item[1]["total_ms"])),
+        }
+
+    def format_summary(self):
+        """The summary as a table, heaviest span names first."""
+        summary = self.summary()
+        lines = [f"Trace of {self.name}: {summary['run_ms']:.0f} ms"]
+        for name, entry in summary["spans"].items():
+            details = ", ".join(
+                f"{key[:-3]} {value:.0f} ms" for key, value in entry.items()
+                if key.endswith("_ms") and key not in ("total_ms", "mean_ms", "max_ms")
+            )
+            lines.append(
+                f"  {name:<18} {entry['count']:>4}x {entry['total_ms']:>9.0f} ms {entry['share']:>6.1%}"
+                f"  mean {entry['mean_ms']:.0f} ms, max {entry['max_ms']:.0f} ms"
+                + (f" ({details})" if details else "")
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time the body as a span named `name`, child of the current span. Yields
+    the span, whose `set` adds attributes known only once the work is done.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield _NO_SPAN
+        return
+    opened = tracer._open(name, _current_span.get(), attributes)
+    token = _current_span.set(opened)
+    try:
+        yield opened
+    except BaseException as e:
+        opened.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        opened.end = tracer.now()
+
+
+def current_span():
+    """The innermost open span, to add attributes from code that does not own it."""
+    return _current_span.get() or _NO_SPAN
+
+
+def current_tracer():
+    """The tracer active in this thread or task, None when tracing is off."""
+    return _tracer.get()
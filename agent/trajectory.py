@@ -0,0 +1,233 @@
+"""
+Recording and LLM-free replay of successful runs.
+
+A successful run is a list of steps `(url, action, resolved xpath / args,
+element, args as the LLM gave them)`. `TrajectoryStore` keeps the last successful trajectory per
+normalized objective and start domain. When the same objective runs again,
+`TrajectoryReplayer` re-executes it without calling the LLM, verifying before
+every step that the page is the expected one (same host and path) and that
+the element to act on is still there with the same text. At the first
+divergence it stops, and the LLM loop takes over from the current page.
+"""
+import os
+import re
+import glob
+import json
+import time
+import hashlib
+from urllib.parse import urlsplit
+
+from agent.registry import ACTIONS
+
+
+# Reads what is needed to recognize an element, null when the xpath is gone
+ELEMENT_AT_XPATH = """xpath => {
+    const element = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!element) return null;
+    return {
+        text: element.textContent.trim(),  // As extracted by js/mark_page.js
+        ariaLabel: element.getAttribute("aria-label") || "",
+        placeholder: element.getAttribute("placeholder") || "",
+    };
+}"""
+
+ELEMENT_FIELDS = ("text", "ariaLabel", "placeholder")
+
+
+def normalize_objective(objective):
+    """Lowercase words only, so that spacing and punctuation do not matter."""
+    return " ".join(re.findall(r"\w+", objective.lower()))
+
+
+_URL_RE = re.compile(r"https?://[^\s\"'<>]+")
+
+
+def start_domain(objective, steps=(), final_url=None):
+    """
+    Domain a run starts on: the one of the URL in the objective if it names
+    one, else the first page the run navigated to (the tab opens on
+    about:blank), else the page it ended on.
+    """
+    match = _URL_RE.search(objective)
+    urls = [match.group(0)] if match else []
+    urls += [step["url"] for step in steps] + [final_url or ""]
+    return next((urlsplit(url).hostname for url in urls if urlsplit(url).hostname), "")
+
+
+def url_key(url):
+    """Host and path of `url`: what has to match for a step to be replayed."""
+    parts = urlsplit(url)
+    if not parts.netloc:
+        return url
+    return parts.netloc.lower() + (parts.path.rstrip("/") or "/")
+
+
+def _same_text(recorded, live):
+    return " ".join(str(recorded).split()) == " ".join(str(live).split())
+
+
+class TrajectoryRecorder:
+    """Collects the steps of a run as they are executed."""
+
+    def __init__(self):
+        self.steps = []
+
+    def record(self, url, action, args, element=None, taken_args=None):
+        """
+        Add a step; `args` are the resolved args that get replayed, `taken_args`
+        the args of the LLM command (with the element id) for the history.
+        """
+        # Element uids only live as long as their document, keep the path
+        args = [arg["path"] if isinstance(arg, dict) else arg for arg in args]
+        self.steps.append({
+            "url": url,
+            "action": action,
+            "args": args,
+            "taken_args": args if taken_args is None else list(taken_args),
+            "element": {field: element.get(field) or "" for field in ELEMENT_FIELDS} if element else None,
+        })
+
+
+def as_taken_action(step):
+    """
+    A replayed step in the form of an LLM action reply, for the action history:
+    with the element id of the live run, like the history of a live run.
+    """
+    return {
+        # Trajectories stored before taken_args only have the resolved args
+        "command": {"action": step["action"], "args": step.get("taken_args", step["args"])},
+        "thoughts": {"text": "Replayed from a previous successful run.", "reasoning": ""},
+    }
+
+
+class TrajectoryStore:
+    """
+    Trajectories on disk, one JSON file per objective and start domain (see
+    `start_domain`). When the objective names no URL, the domain is only
+    known once the run navigated, so the latest trajectory of the objective
+    is loaded; replaying it checks the page of every step, the start domain
+    first.
+    """
+
+    def __init__(self, directory=".trajectories"):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def objective_key(objective):
+        return hashlib.sha256(normalize_objective(objective).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def key(cls, objective, domain):
+        return cls.objective_key(objective) + "-" + (domain or "none")
+
+    def load(self, objective):
+        """The stored steps for this objective, None when there are none."""
+        domain = start_domain(objective)
+        if domain:
+            paths = [self._path(self.key(objective, domain))]
+        else:
+            paths = sorted(glob.glob(self._path(self.objective_key(objective) + "-*")), key=os.path.getmtime, reverse=True)
+        for path in paths:
+            try:
+                with open(path) as f:
+                    return json.load(f)["steps"]
+            except (OSError, ValueError, KeyError):
+                continue
+        return None
+
+    def save(self, objective, steps, final_url=None):
+        """Store the `steps` of a successful run, which ended on `final_url`."""
+        domain = start_domain(objective, steps, final_url)
+        path = self._path(self.key(objective, domain))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"objective": objective, "start_domain": domain, "saved": time.time(), "steps": steps}, f, indent=4)
+        os.replace(tmp_path, path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+
+class _ReplayerBase:
+    def __init__(self, agent):
+        self.agent = agent
+        self.stats = {"replayed": 0, "diverged_at": None, "reason": None}
+
+    def _diverged(self, index, reason):
+        self.stats["diverged_at"] = index
+        self.stats["reason"] = reason
+        print(f"Trajectory replay diverged at step {index}: {reason}")
+        return index
+
+    def _check_url(self, step):
+        if url_key(step["url"]) != url_key(self.agent.page.url):
+            return f"expected {url_key(step['url'])}, the page is {url_key(self.agent.page.url)}"
+        return None
+
+    def _check_element(self, step, live):
+        if live is None:
+            return "the element is not on the page anymore"
+        recorded = step["element"] or {}
+        for field in ELEMENT_FIELDS:
+            if recorded.get(field) and not _same_text(recorded[field], live.get(field, "")):
+                return f"the element {field} changed from {recorded[field]!r} to {live.get(field)!r}"
+        return None
+
+    def _element_xpath(self, step):
+        """The xpath of the element the step acts on, None for other actions."""
+        spec = ACTIONS.get(step["action"])
+        for arg, value in zip(spec.args, step["args"]):
+            if arg.kind == "id":
+                return value["path"] if isinstance(value, dict) else value
+        return None
+
+
+class TrajectoryReplayer(_ReplayerBase):
+    """Replays stored steps with `ActionAgent`."""
+
+    def replay(self, steps, on_step=None):
+        """
+        Execute `steps` while they verify, calling `on_step(step)` after each.
+        Returns the number of steps replayed.
+        """
+        for index, step in enumerate(steps):
+            try:
+                reason = self._check_url(step)
+                xpath = self._element_xpath(step)
+                if reason is None and xpath is not None:
+                    reason = self._check_element(step, self.agent.page.evaluate(ELEMENT_AT_XPATH, xpath))
+                if reason is None:
+                    self.agent.execute(step["action"], *step["args"])
+                    self.agent.wait_till_idle()
+            except Exception as e:
+                reason = str(e)
+            if reason is not None:
+                return self._diverged(index, reason)
+            self.stats["replayed"] += 1
+            if on_step is not None:
+                on_step(step)
+        return len(steps)
+
+
+class AsyncTrajectoryReplayer(_ReplayerBase):
+    """Replays stored steps with `AsyncActionAgent`."""
+
+    async def replay(self, steps, on_step=None):
+        for index, step in enumerate(steps):
+            try:
+                reason = self._check_url(step)
+                xpath = self._element_xpath(step)
+                if reason is None and xpath is not None:
+                    reason = self._check_element(step, await self.agent.page.evaluate(ELEMENT_AT_XPATH, xpath))
+                if reason is None:
+                    await self.agent.execute(step["action"], *step["args"])
+                    await self.agent.wait_till_idle()
+            except Exception as e:
+                reason = str(e)
+            if reason is not None:
+                return self._diverged(index, reason)
+            self.stats["replayed"] += 1
+            if on_step is not None:
+                on_step(step)
+        return len(steps)
@@ -0,0 +1,275 @@
+"""
+Offline benchmark suite: extraction, element cleaning, prompt construction
+and the whole agent loop, against generated fixtures and a stub LLM.
+
+The fixtures (`fixtures.py`) are served from a local HTTP server and the
+Groq client talks to a deterministic local stub of the API (`stub_llm.py`),
+so nothing leaves the machine and every run does the same work. For every
+fixture kind and size it reports p50 / p95 per stage:
+
+    markPage                 legacy full extraction (`helpers.extract_elements`)
+    get_filtered_elements    extraction + `helpers.clean_elements`
+    snapshot.full            snapshot engine resync, split in js / transfer / python
+    snapshot.incremental     snapshot after one small DOM change
+    clean_elements_id_based  `main3.clean_elements_id_based`
+    prompt.next_action       `PragyaGPT._next_action_request` (ranking, prompt budget)
+    loop.*                   `main3.run` following the fixture flow, per traced span
+                             (observe-and-act mode with --observe-and-act)
+
+Results are written to benchmarks/results/<commit>.json; compare two commits
+with `--compare benchmarks/results/<other commit>.json`.
+
+Usage:
+    python benchmarks/bench_agent.py [--kinds flat spa] [--sizes 100 1000] [--repeat 5]
+                                     [--loop-repeat 3] [--skip-loop] [--observe-and-act] [--llm-latency-ms 0]
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, ROOT)
+
+from playwright.sync_api import sync_playwright  # noqa: E402
+
+from fixtures import FIXTURES, DEFAULT_SIZES, FLOW_STEPS, FixtureServer  # noqa: E402
+from stub_llm import StubLLMServer  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+OBJECTIVE = "Go to {url} and follow the Next page links until the last page"
+
+# Nudges one element so that the incremental snapshot has a small diff to take
+MUTATE_ONE = """() => {
+    const target = document.querySelector("main a, main button, main span");
+    if (target) target.textContent += " *";
+}"""
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of `values` (q in 0..100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def stage_stats(timings):
+    return {
+        "runs": len(timings),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+    }
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def bench_stages(page, url, repeat):
+    """Time the extraction, cleaning and prompt stages on the page at `url`."""
+    import main3
+    from helpers import extract_elements, get_filtered_elements
+    from agent import PragyaGPT, SnapshotEngine
+    from agent.tracing import Tracer
+
+    page.goto(url)
+    page.wait_for_load_state("load")
+    # Client-rendered fixtures are measured once they are complete
+    page.wait_for_function("() => !document.querySelector('script') || document.querySelectorAll('main *').length > 0")
+    page.wait_for_timeout(500)
+
+    timings = {}
+
+    def add(stage, milliseconds):
+        timings.setdefault(stage, []).append(milliseconds)
+
+    pragya = PragyaGPT()
+    pragya.final_goal = "Follow the Next page links until the last page."
+    objective = OBJECTIVE.format(url=url)
+    elements = []
+    for _ in range(repeat):
+        _, milliseconds = timed(extract_elements, page)
+        add("markPage", milliseconds)
+        page.evaluate("() => window.unmarkPage && unmarkPage()")
+
+        _, milliseconds = timed(get_filtered_elements, page)
+        add("get_filtered_elements", milliseconds)
+        page.evaluate("() => window.unmarkPage && unmarkPage()")
+
+        engine = SnapshotEngine(page)
+        tracer = Tracer("snapshot")
+        with tracer.activate():
+            _, milliseconds = timed(engine.refresh, True)
+        add("snapshot.full", milliseconds)
+        extract = next(traced for traced in tracer.spans if traced.name == "extract")
+        for part in ("js_ms", "transfer_ms", "python_ms"):
+            add("snapshot.full." + part[:-3], extract.attributes[part])
+
+        page.evaluate(MUTATE_ONE)
+        _, milliseconds = timed(engine.refresh)
+        add("snapshot.incremental", milliseconds)
+
+        snapshot_elements = engine.snapshot.clean_elements
+        elements, milliseconds = timed(main3.clean_elements_id_based, snapshot_elements, page.url)
+        add("clean_elements_id_based", milliseconds)
+
+        pragya.history.clear()
+        _, milliseconds = timed(pragya._next_action_request, objective, page.url, elements, None, pragya._tier_model(0))
+        add("prompt.next_action", milliseconds)
+
+    info = {
+        "nodes": page.evaluate("() => document.querySelectorAll('*').length"),
+        "elements": len(elements),
+    }
+    return info, {stage: stage_stats(values) for stage, values in timings.items()}
+
+
+def bench_loop(playwright, pool, url, repeat, stub, observe_and_act=False):
+    """Run the agent loop on the fixture flow, timing every traced span name."""
+    import main3
+    from agent.tracing import Tracer
+
+    timings = {}
+    llm_requests = []
+    for _ in range(repeat):
+        tracer = Tracer()
+        requests_before = stub.requests
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            main3.run(playwright, pool=pool, user_objective=OBJECTIVE.format(url=url), tracer=tracer,
+                      observe_and_act=observe_and_act)
+        llm_requests.append(stub.requests - requests_before)
+        for traced in tracer.spans:
+            timings.setdefault("loop." + traced.name, []).append(traced.duration * 1000)
+        steps = [traced for traced in tracer.spans if traced.name == "step"]
+        if len(steps) < FLOW_STEPS:
+            print(f"  warning: the loop took {len(steps)} steps, the flow has {FLOW_STEPS} pages")
+    stats = {stage: stage_stats(values) for stage, values in timings.items()}
+    return {"llm_requests": llm_requests}, stats
+
+
+def git_commit():
+    """Short hash of HEAD, with "-dirty" when the tree has uncommitted changes."""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--"], cwd=ROOT) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def print_results(results):
+    print(f"{'fixture':<14} {'stage':<34} {'p50 ms':>10} {'p95 ms':>10}")
+    for fixture, entry in results.items():
+        for stage, stats in entry["stages"].items():
+            print(f"{fixture:<14} {stage:<34} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f}")
+
+
+def print_comparison(results, baseline):
+    """p50 of every stage against `baseline`, the results of another run."""
+    print(f"\nAgainst {baseline['meta']['commit']} ({baseline['meta']['date']}):")
+    print(f"{'fixture':<14} {'stage':<34} {'base p50':>10} {'p50':>10} {'change':>8}")
+    for fixture, entry in results.items():
+        base_stages = baseline["results"].get(fixture, {}).get("stages", {})
+        for stage, stats in entry["stages"].items():
+            base = base_stages.get(stage)
+            if not base or not base["p50_ms"]:
+                continue
+            change = stats["p50_ms"] / base["p50_ms"] - 1
+            print(f"{fixture:<14} {stage:<34} {base['p50_ms']:>10.1f} {stats['p50_ms']:>10.1f} {change:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", nargs="+", choices=sorted(FIXTURES), default=sorted(FIXTURES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="DOM nodes per fixture page")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of every extraction / prompt stage")
+    parser.add_argument("--loop-repeat", type=int, default=3, help="runs of the agent loop per fixture")
+    parser.add_argument("--skip-loop", action="store_true", help="only benchmark the stages, not the agent loop")
+    parser.add_argument("--observe-and-act", action="store_true",
+                        help="run the agent loop with one LLM call per step instead of two")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="delay of every stub LLM reply")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, metavar="RESULTS", help="results file of another commit")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+    # Read before running, the results may overwrite it when the commit is the same
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    from agent.browser_pool import BrowserPool
+    import main3
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="pragya-bench-")
+    with FixtureServer() as fixtures, StubLLMServer(latency_ms=args.llm_latency_ms) as stub:
+        os.environ["GROQ_BASE_URL"] = stub.url
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+        # Cached replies would skip the LLM round trips being measured
+        os.environ["PRAGYA_LLM_CACHE"] = "off"
+        # The stub has no rate limits, the Groq quotas would only add waits
+        os.environ["PRAGYA_LLM_LIMITS"] = "off"
+        # The agent writes its prompt and element dumps to the working directory
+        os.chdir(workdir)
+
+        with sync_playwright() as playwright:
+            pool = BrowserPool(playwright, size=1, launch_options=main3.LAUNCH_OPTIONS)
+            try:
+                for kind in args.kinds:
+                    for size in args.sizes:
+                        fixture = f"{kind}/{size}"
+                        url = fixtures.page_url(kind, size)
+                        print(f"Benchmarking {fixture}...", file=sys.stderr)
+                        context = pool.acquire(no_viewport=True)
+                        try:
+                            info, stages = bench_stages(context.new_page(), url, args.repeat)
+                        finally:
+                            pool.release(context)
+                        if not args.skip_loop:
+                            loop_info, loop_stages = bench_loop(playwright, pool, url, args.loop_repeat, stub, args.observe_and_act)
+                            info.update(loop_info)
+                            stages.update(loop_stages)
+                        results[fixture] = dict(info, stages=stages)
+            finally:
+                pool.close()
+                os.chdir(ROOT)
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "loop_repeat": 0 if args.skip_loop else args.loop_repeat,
+            "llm_latency_ms": args.llm_latency_ms,
+            "observe_and_act": args.observe_and_act,
+        },
+        "results": results,
+    }
+    path = output_path or os.path.join(RESULTS_DIR, output["meta"]["commit"] + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(output, f, indent=4)
+
+    print_results(results)
+    print(f"\nResults written to {path}")
+    if baseline is not None:
+        print_comparison(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
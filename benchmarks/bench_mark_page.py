@@ -0,0 +1,70 @@
+"""
+Benchmark for `markPage()` in js/mark_page.js.
+
+Renders synthetic pages with an increasing number of clickable elements and
+reports how long the in-page extraction takes for each size.
+
+Usage:
+    python benchmarks/bench_mark_page.py [--sizes 100 1000 5000] [--repeat 5] [--lazy]
+"""
+import os
+import time
+import argparse
+import statistics
+from playwright.sync_api import sync_playwright
+
+MARK_PAGE_JS = os.path.join(os.path.dirname(__file__), os.pardir, "js", "mark_page.js")
+
+
+def build_page(n):
+    """Build an HTML page with `n` links, wrapped in clickable cards so that the
+    inner-most filter has real work to do."""
+    rows = []
+    for i in range(n):
+        rows.append(
+            f'<div class="card" onclick="void 0"><span>Item {i}</span>'
+            f'<a href="#item-{i}">Open item {i}</a></div>'
+        )
+    return (
+        "<html><head><style>.card{display:inline-block;padding:2px;margin:1px}</style></head>"
+        "<body>" + "".join(rows) + "</body></html>"
+    )
+
+
+def bench(page, n, repeat, lazy=False):
+    page.set_content(build_page(n))
+    with open(MARK_PAGE_JS) as f:
+        page.evaluate(f.read())
+
+    timings = []
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(page.evaluate("options => markPage(options)", {"lazy": lazy}))
+        timings.append((time.perf_counter() - start) * 1000)
+        page.evaluate("unmarkPage()")
+    return count, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lazy", action="store_true", help="skip the computed-style probe on every node")
+    args = parser.parse_args()
+
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=True)
+        page = browser.new_page(viewport={"width": 1280, "height": 100000})
+
+        print(f"{'links':>8} {'nodes':>8} {'kept':>8} {'median ms':>10} {'min ms':>10}")
+        for n in args.sizes:
+            count, timings = bench(page, n, args.repeat, args.lazy)
+            nodes = page.evaluate("document.querySelectorAll('*').length")
+            print(f"{n:>8} {nodes:>8} {count:>8} {statistics.median(timings):>10.1f} {min(timings):>10.1f}")
+
+        browser.close()
+
+
+if __name__ == "__main__":
+    main()
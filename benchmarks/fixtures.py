@@ -0,0 +1,142 @@
+"""
+Synthetic page fixtures for the benchmarks, served from a local HTTP server.
+
+Every fixture is a short flow of pages `/fixture/<kind>/<nodes>/<step>`: each
+page holds about `nodes` DOM nodes of the given kind and a "Next page" link to
+the following step, except the last one. The stub LLM (see `stub_llm.py`)
+follows these links, so the agent loop can run end to end offline.
+
+Kinds:
+    flat    clickable cards with a label and a link
+    deep    links at the bottom of deeply nested containers
+    spa     an empty shell that renders its rows from script, in batches
+    links   one long list of links
+"""
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FLOW_STEPS = 3
+
+
+def _page(title, body, next_href, script=""):
+    nav = f'<nav><a id="next" href="{next_href}">Next page</a></nav>' if next_href else "<p>This is the last page.</p>"
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title>"
+        "<style>.card{{display:inline-block;padding:2px;margin:1px}}</style></head>"
+        "<body><h1>{title}</h1>{nav}<main>{body}</main>{script}</body></html>"
+    ).format(title=title, nav=nav, body=body, script=script)
+
+
+def flat(nodes, next_href):
+    # div > span + a: 3 nodes per card
+    cards = "".join(
+        f'<div class="card" onclick="void 0"><span>Item {i}</span><a href="#item-{i}">Item link {i}</a></div>'
+        for i in range(max(1, nodes // 3))
+    )
+    return _page(f"Flat {nodes}", cards, next_href)
+
+
+def deep(nodes, next_href, depth=40):
+    # `depth` nested divs around every link
+    chain = depth + 1
+    chains = "".join(
+        "<div>" * depth + f'<a href="#leaf-{i}">Leaf link {i}</a>' + "</div>" * depth
+        for i in range(max(1, nodes // chain))
+    )
+    return _page(f"Deep {nodes}", chains, next_href)
+
+
+def spa(nodes, next_href, batches=10):
+    # The rows come in `batches` animation frames after the load, like a client-rendered app
+    script = """<script>
+    (() => {
+      const total = %d, batch = Math.ceil(total / %d), main = document.querySelector("main");
+      let done = 0;
+      function render() {
+        const rows = document.createDocumentFragment();
+        for (let end = Math.min(total, done + batch); done < end; done++) {
+          const row = document.createElement("div");
+          row.className = "card";
+          row.innerHTML = `<span>Row ${done}</span><button>Select row ${done}</button>`;
+          rows.appendChild(row);
+        }
+        main.appendChild(rows);
+        if (done < total) setTimeout(render, 20);
+      }
+      setTimeout(render, 20);
+    })();
+    </script>""" % (max(1, nodes // 3), batches)
+    return _page(f"SPA {nodes}", "", next_href, script)
+
+
+def links(nodes, next_href):
+    # li > a: 2 nodes per link
+    items = "".join(f'<li><a href="#link-{i}">List link number {i}</a></li>' for i in range(max(1, nodes // 2)))
+    return _page(f"Links {nodes}", f"<ul>{items}</ul>", next_href)
+
+
+FIXTURES = {
+    "flat": flat,
+    "deep": deep,
+    "spa": spa,
+    "links": links,
+}
+
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+
+
+def fixture_path(kind, nodes, step=0):
+    return f"/fixture/{kind}/{nodes}/{step}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    cache = {}
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        try:
+            _, kind, nodes, step = parts
+            nodes, step = int(nodes), int(step)
+            build = FIXTURES[kind]
+        except (ValueError, KeyError):
+            self.send_error(404)
+            return
+        key = (kind, nodes, step)
+        if key not in self.cache:
+            next_href = fixture_path(kind, nodes, step + 1) if step + 1 < FLOW_STEPS else None
+            self.cache[key] = build(nodes, next_href).encode("utf-8")
+        body = self.cache[key]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Serve the fixtures on a free local port while in use as a context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_url(self, kind, nodes, step=0):
+        return self.url + fixture_path(kind, nodes, step)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,196 @@
+"""
+Deterministic local stand-in for the Groq chat completions API.
+
+It answers the prompts of `PragyaGPT` without any model: the final goal and
+the observations are fixed sentences, the first step goes to the first URL of
+the objective, and the next action clicks the "Next page" element when the
+prompt lists one and declares the goal achieved otherwise (the flow of the
+fixtures in `fixtures.py`), with an observation in observe-and-act mode. Streaming requests get server-sent events like
+the real API. `latency_ms` delays every reply, to model a remote API.
+
+It serves both the Groq path and the plain OpenAI-compatible one, so either
+provider of `agent.providers` can be pointed at it. Standalone:
+    python benchmarks/stub_llm.py --port 8765
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub python main3.py "..."
+    python main3.py --llm-provider openai --llm-base-url http://127.0.0.1:8765/v1 "..."
+"""
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+COMPLETION_PATHS = ("/openai/v1/chat/completions", "/v1/chat/completions")
+
+URL = re.compile(r"https?://[^\s\"'<>]+")
+# An element whose text is "Next page", in the compact and in the repr encoding
+NEXT_ELEMENT = (
+    re.compile(r"^\s*(\d+)\|Next page\b", re.MULTILINE),
+    re.compile(r"'id': (\d+), 'text': 'Next page'"),
+)
+
+
+def _action(action, args=(), text="", observation=None):
+    reply = {} if observation is None else {"observation": observation}
+    reply["command"] = {"action": action, "args": list(args)}
+    reply["thoughts"] = {"text": text, "reasoning": "Benchmark stub."}
+    return json.dumps(reply)
+
+
+def reply_to(request):
+    """The content of the reply to a chat completion `request`."""
+    prompt = request["messages"][-1]["content"]
+    if "final goal for the user's objective" in prompt:
+        return "Follow the Next page links until the last page."
+    if "json_object" not in json.dumps(request.get("response_format")) and "Analyse the current page" in prompt:
+        return "The page lists its elements; the Next page link leads further."
+    if "Current URL:" not in prompt:
+        # First step: no page yet
+        url = URL.search(prompt)
+        return _action("_go_to_url", [url.group(0).rstrip(".,")], "Go to the start page.") if url else _action("_google_search", ["benchmark"])
+    # Observe-and-act prompts ask for the observation along with the action
+    observation = "A page of the fixture flow." if '"observation":' in prompt else None
+    for pattern in NEXT_ELEMENT:
+        match = pattern.search(prompt.split("Current URL:", 1)[1])
+        if match:
+            return _action("_click", [int(match.group(1))], "Follow the Next page link.", observation)
+    return _action("_set_goal_achieved", [], "This is the last page.", observation)
+
+
+def _tokens(text):
+    # Close enough for the usage block, the benchmarks do not bill
+    return max(1, len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle the body would
+    # wait for the delayed ACK of the headers (~40 ms) on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if self.path.split("?")[0] not in COMPLETION_PATHS:
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        content = reply_to(request)
+        self.server.requests += 1
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+        if request.get("stream"):
+            self._stream(request, content)
+        else:
+            self._send_json(self._completion(request, content))
+
+    def _completion(self, request, content):
+        prompt_tokens = sum(_tokens(message["content"]) for message in request["messages"])
+        return {
+            "id": f"chatcmpl-stub-{self.server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": _tokens(content),
+                "total_tokens": prompt_tokens + _tokens(content),
+            },
+        }
+
+    def _stream(self, request, content, chunk_chars=8):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+        usage = self._completion(request, content)["usage"]
+        for piece in pieces + [None]:
+            chunk = {
+                "id": f"chatcmpl-stub-{self.server.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": piece} if piece is not None else {},
+                    "finish_reason": None if piece is not None else "stop",
+                }],
+            }
+            if piece is None:
+                # Where Groq reports the usage of a stream
+                chunk["x_groq"] = {"id": chunk["id"], "usage": usage}
+            self._send_event(chunk)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            # Where OpenAI-compatible APIs report it
+            self._send_event({"id": f"chatcmpl-stub-{self.server.requests}", "object": "chat.completion.chunk",
+                              "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubLLMServer:
+    """Serve the stub API on a local port while in use as a context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.latency_ms = latency_ms
+        self.server.requests = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay of every reply")
+    args = parser.parse_args()
+
+    with StubLLMServer(port=args.port, latency_ms=args.latency_ms) as stub:
+        print(f"Stub LLM listening on {stub.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,181 @@
 """
 Helper functions 
 """
+import os
 import json
+import weakref
+import functools
 
 
-def get_filtered_elements(page):
-    with open("js/mark_page.js") as f:
-        js = f.read()
+JS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "js")
 
-    page.evaluate(js)
-    elements = page.evaluate("markPage()")
-    page.evaluate("unmarkPage()")
+# Mark and unmark in a single round trip; null when the extractor is missing
+MARK_PAGE_CALL = """options => {
+    if (!window.markPage) return null;
+    const elements = markPage(options);
+    unmarkPage();
+    return elements;
+}"""
 
-    clean_elements = []
+# Pages that already have the extractor registered as an init script
+_installed_pages = weakref.WeakSet()
+
+# Selector engine targeting elements by their snapshot uid, see js/element_engine.js
+ELEMENT_ENGINE = "pragya"
+_engine_registered = weakref.WeakSet()
+
+
+@functools.lru_cache(maxsize=None)
+def load_js(name):
+    """Read a script from the `js` folder once per process."""
+    with open(os.path.join(JS_DIR, name)) as f:
+        return f.read()
+
+
+def install_mark_page(target):
+    """
+    Register `js/mark_page.js` on a page or a browser context.
+
+    The script is added as an init script, so every document loaded afterwards
+    already has `markPage` / `unmarkPage` defined, and it is also evaluated on
+    the pages that are already open. The script guards itself, so installing it
+    twice on the same document is harmless.
+    """
+    if target in _installed_pages:
+        return
+    js = load_js("mark_page.js")
+    target.add_init_script(script=js)
+    pages = target.pages if hasattr(target, "pages") else [target]
+    for page in pages:
+        page.evaluate(js)
+        _installed_pages.add(page)
+    _installed_pages.add(target)
+
+
+def register_element_engine(playwright):
+    """
+    Register `js/element_engine.js`, so that actions target the element kept
+    in-page for a uid instead of resolving its XPath. Contexts created before
+    the registration do not get the engine.
+    """
+    if playwright in _engine_registered:
+        return
+    playwright.selectors.register(ELEMENT_ENGINE, script=load_js("element_engine.js"))
+    _engine_registered.add(playwright)
+
+
+async def register_element_engine_async(playwright):
+    if playwright in _engine_registered:
+        return
+    await playwright.selectors.register(ELEMENT_ENGINE, script=load_js("element_engine.js"))
+    _engine_registered.add(playwright)
+
+
+def element_ref(element):
+    """What an action targets: the element uid in its document, and its path as a fallback."""
+    return {"uid": element.get("uid"), "document": element.get("document"), "path": element["path"]}
+
+
+def element_selector(target):
+    """Playwright selector of an action target, an `element_ref` or an XPath."""
+    if isinstance(target, dict):
+        if len(_engine_registered) and target.get("uid") is not None:
+            return ELEMENT_ENGINE + "=" + json.dumps(target)
+        target = target["path"]
+    return f"xpath={target}"
+
+
+def evaluate_extractor(page, call, arg=None):
+    """
+    Evaluate `call` against the installed extractor, installing it first if
+    needed. `call` must return null when the extractor is missing from the
+    current document (e.g. it was created before the init script was added).
+    """
+    if page not in _installed_pages and page.context not in _installed_pages:
+        install_mark_page(page)
+
+    result = page.evaluate(call, arg)
+    if result is None:
+        page.evaluate(load_js("mark_page.js"))
+        result = page.evaluate(call, arg)
+    return result
+
+
+async def install_mark_page_async(target):
+    """`install_mark_page` for `playwright.async_api` pages and contexts."""
+    if target in _installed_pages:
+        return
+    js = load_js("mark_page.js")
+    await target.add_init_script(script=js)
+    pages = target.pages if hasattr(target, "pages") else [target]
+    for page in pages:
+        await page.evaluate(js)
+        _installed_pages.add(page)
+    _installed_pages.add(target)
+
+
+async def evaluate_extractor_async(page, call, arg=None):
+    """`evaluate_extractor` for `playwright.async_api` pages."""
+    if page not in _installed_pages and page.context not in _installed_pages:
+        await install_mark_page_async(page)
+
+    result = await page.evaluate(call, arg)
+    if result is None:
+        await page.evaluate(load_js("mark_page.js"))
+        result = await page.evaluate(call, arg)
+    return result
+
+
+def extract_elements(page, lazy=False):
+    """
+    Run the in-page extractor and return the raw clickable elements.
+
+    Only the `markPage` entry point is evaluated per call; the script itself is
+    installed once per page (see `install_mark_page`).
+    """
+    return evaluate_extractor(page, MARK_PAGE_CALL, {"lazy": lazy})
+
+
+def get_filtered_elements(page, lazy=False):
+    """
+    Extract the clickable elements of the page that carry some text.
+
+    With `lazy=True` the extractor only looks at tags, roles and onclick
+    handlers and skips the computed-style probe on every node.
+    """
+    elements = extract_elements(page, lazy=lazy)
+    return clean_elements(elements)
+
+
+async def get_filtered_elements_async(page, lazy=False):
+    """`get_filtered_elements` for `playwright.async_api` pages."""
+    elements = await evaluate_extractor_async(page, MARK_PAGE_CALL, {"lazy": lazy})
+    return clean_elements(elements)
+
+
+def clean_elements(elements, document_id=None):
+    """
+    Keep the elements that carry some text, with only the fields the prompt
+    needs, plus the uid and document of snapshot elements for the actions.
+    """
+    cleaned = []
     for element in elements:
         if element["text"] or element["ariaLabel"] or element["placeholder"] or element["label"]:
             clean_element = {}
+            if "uid" in element:
+                clean_element["uid"] = element["uid"]
+                clean_element["document"] = document_id
             clean_element["text"] = element["text"]
             clean_element["ariaLabel"] = element["ariaLabel"]
             clean_element["path"] = element["path"]
             clean_element["placeholder"] = element["placeholder"]
             clean_element["label"] = element["label"]
-            clean_elements.append(clean_element)
+            cleaned.append(clean_element)
 
-    return clean_elements
+    return cleaned
 
 
 def parse_json_garbage(s):
-    s = s[next(idx for idx, c in enumerate(s) if c in "{["):]
-    try:
-        return json.loads(s)
-    except json.JSONDecodeError as e:
-        return json.loads(s[:e.pos])
-    
-
-def get_actions_taken(actions: list):
-    filtered_actions = []
-    for action in actions:
-        action_bullet_str = "- " + action["command"]["action"]
-        if "args" in action["command"]:
-            action_bullet_str += " with args " + str(action["command"]["args"])
-
-    cleaned_actions = str("\n".join(filtered_actions))
-
-    if cleaned_actions.strip():
-        return actions
-    else:
-        return "None."
-    
-def get_actions_taken_with_thoughts(actions: list):
-    print(actions)
-    filtered_actions = []
-    for action in actions:
-        action_bullet_str = "- " + action["command"]["action"]
-        # if "args" in action["command"]:
-        #     action_bullet_str += " with args " + str(action["command"]["args"])
-        if "thoughts" in action:
-            action_bullet_str += " with thoughts " + action["thoughts"]["text"]
-
-    cleaned_actions = str("\n".join(filtered_actions))
-    print("Cleaned actions: ", cleaned_actions)
-
-    if cleaned_actions.strip():
-        return actions
-    else:
-        exit()
-        return "None."
-    
+    """Kept for old callers, see `agent.output.parse_json`."""
+    from agent.output import parse_json
+    return parse_json(s)
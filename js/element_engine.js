@@ -0,0 +1,21 @@
+// Playwright selector engine `pragya={"uid": 12, "document": "...", "path": "..."}`.
+// Targets the element kept in-page by js/mark_page.js for that uid, and falls
+// back to the element path (XPath) when the element is gone or the page is a
+// new document. Registered by helpers.register_element_engine.
+({
+  queryAll(root, selector) {
+    const target = JSON.parse(selector);
+    const element = window.pragyaElement ? window.pragyaElement(target.uid, target.document) : null;
+    if (element) return [element];
+    if (!target.path) return [];
+    const document = root.ownerDocument || root;
+    const found = document.evaluate(
+      target.path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    return found ? [found] : [];
+  },
+
+  query(root, selector) {
+    return this.queryAll(root, selector)[0] || null;
+  },
+})
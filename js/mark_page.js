@@ -1,191 +1,548 @@
-const customCSS = `
-    ::-webkit-scrollbar {
-        width: 10px;
+// Installed once per page (as an init script and on the current document),
+// the guard makes repeated installs a no-op so the style tag and the
+// extractor state are only ever created once per document.
+(() => {
+  if (window.__pragyaMarkPageInstalled) return;
+  window.__pragyaMarkPageInstalled = true;
+
+  const customCSS = `
+      ::-webkit-scrollbar {
+          width: 10px;
+      }
+      ::-webkit-scrollbar-track {
+          background: #27272a;
+      }
+      ::-webkit-scrollbar-thumb {
+          background: #888;
+          border-radius: 0.375rem;
+      }
+      ::-webkit-scrollbar-thumb:hover {
+          background: #555;
+      }
+  `;
+
+  function installStyle() {
+    if (document.getElementById("pragya-scrollbar-style")) return;
+    const styleTag = document.createElement("style");
+    styleTag.id = "pragya-scrollbar-style";
+    styleTag.textContent = customCSS;
+    (document.head || document.documentElement).append(styleTag);
+  }
+
+  // As an init script we run before <head> exists, so wait for the document
+  if (document.head) {
+    installStyle();
+  } else {
+    document.addEventListener("DOMContentLoaded", installStyle, { once: true });
+  }
+
+  let labels = [];
+
+  function unmarkPage() {
+    // Unmark page logic
+    ignoreOwnMutations(() => {
+      for (const label of labels) {
+        label.remove();
+      }
+    });
+    labels = [];
+  }
+
+  // Positional XPath of elements, e.g. `id("main")/DIV[2]/A[1]`. A builder is
+  // created per extraction pass and memoizes the path of every ancestor and the
+  // positions of the children of every parent, so each parent's children are
+  // walked once per pass instead of once per element below it.
+  function createPathBuilder() {
+    const paths = new Map();
+    const positions = new Map(); // parent -> (child -> index among same-tag siblings)
+
+    function positionOf(element) {
+      const parent = element.parentNode;
+      let indexes = positions.get(parent);
+      if (!indexes) {
+        indexes = new Map();
+        const counts = {};
+        for (const child of parent.children) {
+          counts[child.tagName] = (counts[child.tagName] || 0) + 1;
+          indexes.set(child, counts[child.tagName]);
+        }
+        positions.set(parent, indexes);
+      }
+      return indexes.get(element);
     }
-    ::-webkit-scrollbar-track {
-        background: #27272a;
+
+    return function pathTo(element) {
+      let path = paths.get(element);
+      if (path !== undefined) return path;
+      if (element.id !== "") {
+        path = 'id("' + element.id + '")';
+      } else if (element === document.body) {
+        path = "/html/body";
+      } else if (!(element.parentNode instanceof Element)) {
+        path = "/" + element.tagName.toLowerCase();
+      } else {
+        path = pathTo(element.parentNode) + "/" + element.tagName + "[" + positionOf(element) + "]";
+      }
+      paths.set(element, path);
+      return path;
+    };
+  }
+
+  // Tags that are always worth considering, no matter how they are styled.
+  const CLICKABLE_TAGS = new Set([
+    "INPUT",
+    "TEXTAREA",
+    "SELECT",
+    "BUTTON",
+    "A",
+    "IFRAME",
+    "VIDEO",
+  ]);
+
+  // ARIA roles that mark an element as interactive in lazy mode.
+  const CLICKABLE_ROLES = new Set([
+    "button",
+    "link",
+    "checkbox",
+    "radio",
+    "switch",
+    "tab",
+    "menuitem",
+    "option",
+    "textbox",
+    "searchbox",
+    "combobox",
+  ]);
+
+  // Cheap check that only looks at the tag and attributes of the element and
+  // never touches style or layout.
+  function isCheapCandidate(element, lazy) {
+    if (CLICKABLE_TAGS.has(element.tagName) || element.onclick != null) {
+      return true;
     }
-    ::-webkit-scrollbar-thumb {
-        background: #888;
-        border-radius: 0.375rem;
+    return lazy && CLICKABLE_ROLES.has(element.getAttribute("role"));
+  }
+
+  function getVisibleRects(element, vw, vh) {
+    return [...element.getClientRects()]
+      .filter((bb) => {
+        let center_x = bb.left + bb.width / 2;
+        let center_y = bb.top + bb.height / 2;
+        let elAtCenter = document.elementFromPoint(center_x, center_y);
+
+        return elAtCenter === element || element.contains(elAtCenter);
+      })
+      .map((bb) => {
+        const rect = {
+          left: Math.max(0, bb.left),
+          top: Math.max(0, bb.top),
+          right: Math.min(vw, bb.right),
+          bottom: Math.min(vh, bb.bottom),
+        };
+        return {
+          ...rect,
+          width: rect.right - rect.left,
+          height: rect.bottom - rect.top,
+        };
+      });
+  }
+
+  // Keep only the clickable items that have no clickable descendant.
+  //
+  // `items` must be in document order (as returned by querySelectorAll), so
+  // walking it backwards visits every descendant before its ancestors. A single
+  // pass then marks "has a clickable descendant" on each parent as we go, which
+  // keeps the filter linear in the number of elements instead of comparing every
+  // pair of items.
+  function keepInnermost(items) {
+    const hasClickableDescendant = new Set();
+    const kept = [];
+
+    for (let i = items.length - 1; i >= 0; i--) {
+      const item = items[i];
+      const element = item.element;
+      const clickable = item.include && item.area >= 20;
+
+      if (clickable && !hasClickableDescendant.has(element)) {
+        kept.push(item);
+      }
+      if ((clickable || hasClickableDescendant.has(element)) && element.parentElement) {
+        hasClickableDescendant.add(element.parentElement);
+      }
+    }
+
+    return kept.reverse();
+  }
+
+  function getViewport() {
+    return {
+      vw: Math.max(document.documentElement.clientWidth || 0, window.innerWidth || 0),
+      vh: Math.max(document.documentElement.clientHeight || 0, window.innerHeight || 0),
+    };
+  }
+
+  // Phases 1 and 2 below: cheap filter, then geometry for candidates only.
+  function collectCandidates(elements, lazy) {
+    const { vw, vh } = getViewport();
+
+    const items = elements.map((element) => ({
+      element: element,
+      include:
+        isCheapCandidate(element, lazy) ||
+        (!lazy && window.getComputedStyle(element).cursor == "pointer"),
+      area: 0,
+      rects: [],
+    }));
+
+    // Geometry and hit-testing only for the candidates
+    measureGeometry(
+      items.filter((item) => item.include),
+      vw,
+      vh
+    );
+    return items;
+  }
+
+  // Visible rects and area of `items`, all reads, no DOM writes in between.
+  function measureGeometry(items, vw, vh) {
+    if (vw === undefined) ({ vw, vh } = getViewport());
+    for (const item of items) {
+      item.rects = getVisibleRects(item.element, vw, vh);
+      item.area = item.rects.reduce((acc, rect) => acc + rect.width * rect.height, 0);
+    }
+  }
+
+  function serializeElement(element, pathTo) {
+    let label = ""; // Initialize label variable
+
+    // Check if the element has a label associated with it
+    const labelElement = element.closest("label");
+    if (labelElement) {
+      label = labelElement.textContent.trim();
+    }
+
+    return {
+      text: element.textContent.trim().replace(/\s{2,}/g, " "),
+      type: element.tagName.toLowerCase(),
+      ariaLabel: element.getAttribute("aria-label") || "",
+      path: pathTo(element), // save xpath of the element
+      placeholder: element.getAttribute("placeholder") || "",
+      label: label,
+    };
+  }
+
+  // Extract the clickable elements of the page and outline them.
+  //
+  // The work is split in phases so that the browser never has to interleave
+  // layout reads with DOM writes:
+  //   1. cheap filter on tag / attributes (plus `cursor: pointer` unless lazy),
+  //   2. geometry and hit-testing for the surviving candidates only,
+  //   3. inner-most filtering (pure JS),
+  //   4. text, label and xpath for the kept items only,
+  //   5. all DOM writes (the outlines) at once.
+  //
+  // With `{ lazy: true }` the `getComputedStyle` probe is skipped and ARIA roles
+  // are used instead, so no style is resolved for nodes that can never be kept.
+  function markPage({ lazy = false } = {}) {
+    unmarkPage();
+
+    // Get all elements on the page and filter out the ones that are not clickable
+    let items = collectCandidates([...document.querySelectorAll("*")], lazy);
+
+    // Only keep inner clickable items
+    items = keepInnermost(items);
+
+    const pathTo = createPathBuilder();
+    const clickableItems = items.map((item) => serializeElement(item.element, pathTo));
+
+    // Lets create a floating border on top of these elements that will always be visible.
+    // All outlines go into one fragment so the document is only written once.
+    ignoreOwnMutations(() => {
+      const fragment = document.createDocumentFragment();
+      items.forEach(function (item) {
+        item.rects.forEach((bbox) => {
+          const newElement = document.createElement("div");
+          const borderColor = "#00FF00";
+          newElement.style.outline = `2px solid ${borderColor}`;
+          newElement.style.position = "fixed";
+          newElement.style.left = bbox.left + "px";
+          newElement.style.top = bbox.top + "px";
+          newElement.style.width = bbox.width + "px";
+          newElement.style.height = bbox.height + "px";
+          newElement.style.pointerEvents = "none";
+          newElement.style.boxSizing = "border-box";
+          newElement.style.zIndex = 2147483647;
+
+          fragment.appendChild(newElement);
+          labels.push(newElement);
+        });
+      });
+      document.body.appendChild(fragment);
+    });
+
+    return clickableItems;
+  }
+
+  // ---------------------------------------------------------------------------
+  // Incremental snapshots
+  //
+  // A MutationObserver records the roots of the subtrees that changed since the
+  // last snapshot. `snapshot()` then only re-probes those subtrees and reuses the
+  // cached candidates everywhere else. A change can move elements it does not
+  // touch (an expanded panel, a banner inserted above), so the geometry of the
+  // cached candidates is re-measured, in one read pass. Scrolling and resizing
+  // the window change what is visible without touching the DOM, so they force a
+  // full pass; the document resizing on its own (an image or a font loading)
+  // only marks the geometry dirty. Every element gets a stable uid for the lifetime of the document,
+  // which is what the added / removed / changed diff is keyed on.
+  // ---------------------------------------------------------------------------
+
+  const documentId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+  const uids = new WeakMap();
+  let nextUid = 1;
+
+  let snapshotVersion = 0;
+  let snapshotLazy = null;
+  let snapshotItems = new Map(); // uid -> serialized item of the last snapshot
+  const elementsByUid = new Map(); // uid -> element, what actions target
+  let candidates = new Map(); // element -> candidate item
+  let dirtyRoots = new Set();
+  let fullDirty = true;
+  let geometryDirty = false;
+  let observer = null;
+  let resizeObserver = null;
+  let observedRoot = null;
+
+  function uidOf(element) {
+    let uid = uids.get(element);
+    if (uid === undefined) {
+      uid = nextUid++;
+      uids.set(element, uid);
     }
-    ::-webkit-scrollbar-thumb:hover {
-        background: #555;
+    return uid;
+  }
+
+  function recordMutations(records) {
+    for (const record of records) {
+      const target =
+        record.target.nodeType === Node.ELEMENT_NODE
+          ? record.target
+          : record.target.parentElement;
+      if (target) dirtyRoots.add(target);
     }
-`;
+  }
 
-const styleTag = document.createElement("style");
-styleTag.textContent = customCSS;
-document.head.append(styleTag);
+  // Run DOM writes of our own (outlines) without marking the page dirty.
+  function ignoreOwnMutations(fn) {
+    if (observer) recordMutations(observer.takeRecords());
+    fn();
+    if (observer) observer.takeRecords();
+  }
 
-let labels = [];
+  // (Re)start observing the current root element. `document.open()` (used by
+  // e.g. Playwright's `setContent`) replaces it without reloading this script.
+  function startObserver() {
+    if (!document.documentElement) return;
+    if (observer && observedRoot === document.documentElement) return;
 
-function unmarkPage() {
-  // Unmark page logic
-  for (const label of labels) {
-    document.body.removeChild(label);
+    if (observer) observer.disconnect();
+    observer = new MutationObserver(recordMutations);
+    observedRoot = document.documentElement;
+    observer.observe(observedRoot, {
+      childList: true,
+      subtree: true,
+      attributes: true,
+      characterData: true,
+    });
+    fullDirty = true;
+
+    if (window.ResizeObserver) {
+      if (resizeObserver) resizeObserver.disconnect();
+      resizeObserver = new ResizeObserver(() => {
+        geometryDirty = true;
+      });
+      resizeObserver.observe(observedRoot);
+      if (document.body) resizeObserver.observe(document.body);
+    }
+
+    const invalidate = () => {
+      fullDirty = true;
+    };
+    window.addEventListener("scroll", invalidate, { capture: true, passive: true });
+    window.addEventListener("resize", invalidate, { passive: true });
   }
-  labels = [];
-}
 
-function getPathTo(element) {
-  if (element.id !== '')
-    return 'id("' + element.id + '")';
-  if (element === document.body)
-    return element.tagName;
+  // Keep only the dirty roots that are still in the document and not already
+  // inside another dirty root.
+  function outermostRoots(roots) {
+    const result = [];
+    for (const root of roots) {
+      if (!root.isConnected) continue;
+      let parent = root.parentElement;
+      while (parent && !roots.has(parent)) parent = parent.parentElement;
+      if (!parent) result.push(root);
+    }
+    return result;
+  }
 
-  var ix = 0;
-  var siblings = element.parentNode.childNodes;
-  for (var i = 0; i < siblings.length; i++) {
-    var sibling = siblings[i];
-    if (sibling === element)
-      return getPathTo(element.parentNode) + '/' + element.tagName + '[' + (ix + 1) + ']';
-    if (sibling.nodeType === 1 && sibling.tagName === element.tagName)
-      ix++;
+  function isInside(element, roots) {
+    for (let node = element; node; node = node.parentElement) {
+      if (roots.has(node)) return true;
+    }
+    return false;
   }
-}
 
-function markPage() {
-  unmarkPage();
+  // Same result as keepInnermost() but for items in arbitrary order: every
+  // clickable item marks its ancestors, stopping at the first one already
+  // marked, so each element is visited at most once. Returns document order.
+  function keepInnermostUnordered(items) {
+    const hasClickableDescendant = new Set();
+    const clickable = items.filter((item) => item.include && item.area >= 20);
 
-  let bodyRect = document.body.getBoundingClientRect();
+    for (const item of clickable) {
+      let parent = item.element.parentElement;
+      while (parent && !hasClickableDescendant.has(parent)) {
+        hasClickableDescendant.add(parent);
+        parent = parent.parentElement;
+      }
+    }
 
-  // Get all elements on the page and filter out the ones that are not clickable
-  let items = Array.prototype.slice
-    .call(document.querySelectorAll("*"))
-    .map(function (element, index) {
-      let vw = Math.max(
-        document.documentElement.clientWidth || 0,
-        window.innerWidth || 0
+    return clickable
+      .filter((item) => !hasClickableDescendant.has(item.element))
+      .sort((a, b) =>
+        a.element.compareDocumentPosition(b.element) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1
       );
-      let vh = Math.max(
-        document.documentElement.clientHeight || 0,
-        window.innerHeight || 0
-      );
-      let textualContent = element.textContent.trim().replace(/\s{2,}/g, " ");
-      let elementType = element.tagName.toLowerCase();
-      let ariaLabel = element.getAttribute("aria-label") || "";
-      let placeholder = element.getAttribute("placeholder") || "";
-      let label = ""; // Initialize label variable
-
-      // Check if the element has a label associated with it
-      const labelElement = element.closest("label");
-      if (labelElement) {
-        label = labelElement.textContent.trim();
+  }
+
+  // Whether anything happened since the last snapshot that could change it.
+  function isDirty() {
+    if (!observer || observedRoot !== document.documentElement) return true;
+    recordMutations(observer.takeRecords());
+    return fullDirty || geometryDirty || dirtyRoots.size > 0;
+  }
+
+  // Take a snapshot of the clickable elements and diff it against the previous
+  // one. `base` is the version the caller already has; if it does not match
+  // ours, every element is returned as added so the caller can resync.
+  function snapshot({ lazy = false, full = false, base = null } = {}) {
+    const started = performance.now();
+    startObserver();
+    if (observer) recordMutations(observer.takeRecords());
+
+    const rebuild = full || fullDirty || lazy !== snapshotLazy;
+    let rootSet = new Set();
+    let aboveRoots = new Set();
+    if (rebuild) {
+      candidates = new Map();
+      for (const item of collectCandidates([...document.querySelectorAll("*")], lazy)) {
+        if (item.include) candidates.set(item.element, item);
       }
+    } else {
+      const measured = new Set();
+      if (dirtyRoots.size) {
+        const roots = outermostRoots(dirtyRoots);
+        rootSet = new Set(roots);
+        for (const root of roots) {
+          for (let node = root.parentElement; node && !aboveRoots.has(node); node = node.parentElement) {
+            aboveRoots.add(node);
+          }
+        }
 
-      // save xpath of the element
-      path = getPathTo(element);
-
-      let rects = [...element.getClientRects()]
-        .filter((bb) => {
-          let center_x = bb.left + bb.width / 2;
-          let center_y = bb.top + bb.height / 2;
-          let elAtCenter = document.elementFromPoint(center_x, center_y);
-
-          return elAtCenter === element || element.contains(elAtCenter);
-        })
-        .map((bb) => {
-          const rect = {
-            left: Math.max(0, bb.left),
-            top: Math.max(0, bb.top),
-            right: Math.min(vw, bb.right),
-            bottom: Math.min(vh, bb.bottom),
-          };
-          return {
-            ...rect,
-            width: rect.right - rect.left,
-            height: rect.bottom - rect.top,
-          };
-        });
+        for (const element of [...candidates.keys()]) {
+          if (!element.isConnected || isInside(element, rootSet)) candidates.delete(element);
+        }
+        // Ancestors of a changed subtree may have been resized by the change
+        const elements = [...candidates.keys()].filter((element) => aboveRoots.has(element));
+        for (const root of roots) {
+          elements.push(root, ...root.querySelectorAll("*"));
+        }
+        for (const item of collectCandidates(elements, lazy)) {
+          measured.add(item.element);
+          if (item.include) {
+            candidates.set(item.element, item);
+          } else {
+            candidates.delete(item.element);
+          }
+        }
+      }
+      // Elements outside the changed subtrees may have moved in or out of view
+      measureGeometry([...candidates.values()].filter((item) => !measured.has(item.element)));
+    }
+    dirtyRoots = new Set();
+    fullDirty = false;
+    geometryDirty = false;
+    snapshotLazy = lazy;
 
-      let area = rects.reduce((acc, rect) => acc + rect.width * rect.height, 0);
-
-      return {
-        element: element,
-        path: path,
-        include:
-          element.tagName === "INPUT" ||
-          element.tagName === "TEXTAREA" ||
-          element.tagName === "SELECT" ||
-          element.tagName === "BUTTON" ||
-          element.tagName === "A" ||
-          element.onclick != null ||
-          window.getComputedStyle(element).cursor == "pointer" ||
-          element.tagName === "IFRAME" ||
-          element.tagName === "VIDEO",
-        area,
-        rects,
-        text: textualContent,
-        type: elementType,
-        ariaLabel: ariaLabel,
-        placeholder: placeholder,
-        label: label, // Assign label to the item
-      };
-    })
-    .filter((item) => item.include && item.area >= 20);
-
-  // Only keep inner clickable items 
-  items = items.filter(
-    (x) => !items.some((y) => x.element.contains(y.element) && !(x == y))
-  );
-
-  const clickableItems =
-    items.map((item) => ({
-      text: item.text,
-      type: item.type,
-      ariaLabel: item.ariaLabel,
-      path: item.path,
-      placeholder: item.placeholder,
-      label: item.label,
-      type: item.type,
-    }));
+    const items = new Map();
+    const order = [];
+    const pathTo = createPathBuilder();
+    for (const item of keepInnermostUnordered([...candidates.values()])) {
+      const element = item.element;
+      const uid = uidOf(element);
+      elementsByUid.set(uid, element);
+      // Text and paths can only have changed inside or above a changed subtree
+      const stale =
+        rebuild || aboveRoots.has(element) || (rootSet.size > 0 && isInside(element, rootSet));
+      const cached = stale ? null : snapshotItems.get(uid);
+      items.set(uid, cached || { uid: uid, ...serializeElement(element, pathTo) });
+      order.push(uid);
+    }
+    for (const [uid, element] of elementsByUid) {
+      if (!element.isConnected) elementsByUid.delete(uid);
+    }
 
-  // Lets create a floating border on top of these elements that will always be visible
-  items.forEach(function (item, index) {
-    item.rects.forEach((bbox) => {
-      newElement = document.createElement("div");
-      const borderColor = "#00FF00";
-      newElement.style.outline = `2px solid ${borderColor}`;
-      newElement.style.position = "fixed";
-      newElement.style.left = bbox.left + "px";
-      newElement.style.top = bbox.top + "px";
-      newElement.style.width = bbox.width + "px";
-      newElement.style.height = bbox.height + "px";
-      newElement.style.pointerEvents = "none";
-      newElement.style.boxSizing = "border-box";
-      newElement.style.zIndex = 2147483647;
-      // newElement.style.background = `${borderColor}80`;
-
-      // // Add floating label at the corner
-      // let label = document.createElement("span");
-      // label.textContent = index;
-      // label.style.position = "absolute";
-      // // These we can tweak if we want
-      // label.style.top = "-19px";
-      // label.style.left = "0px";
-      // label.style.background = borderColor;
-      // // label.style.background = "black";
-      // label.style.color = "white";
-      // label.style.padding = "2px 4px";
-      // label.style.fontSize = "12px";
-      // label.style.borderRadius = "2px";
-      // newElement.appendChild(label);
-
-      document.body.appendChild(newElement);
-      labels.push(newElement);
-      // item.element.setAttribute("-ai-label", label.textContent);
-    });
-  });
-  // const coordinates = items.flatMap((item) =>
-  //   item.rects.map(({ left, top, width, height }) => ({
-  //     x: (left + left + width) / 2,
-  //     y: (top + top + height) / 2,
-  //     type: item.type,
-  //     text: item.text,
-  //     ariaLabel: item.ariaLabel,
-  //   }))
-  // );
-  // return coordinates;
-  return clickableItems;
-}
\ No newline at end of file
+    const resync = base !== snapshotVersion;
+    const added = [];
+    const changed = [];
+    const removed = [];
+    for (const [uid, item] of items) {
+      const previous = snapshotItems.get(uid);
+      if (resync || !previous) {
+        added.push(item);
+      } else if (JSON.stringify(previous) !== JSON.stringify(item)) {
+        changed.push(item);
+      }
+    }
+    for (const uid of snapshotItems.keys()) {
+      if (!items.has(uid)) removed.push(uid);
+    }
+
+    if (added.length || changed.length || removed.length || snapshotVersion === 0) {
+      snapshotVersion++;
+    }
+    snapshotItems = items;
+
+    return {
+      documentId: documentId,
+      version: snapshotVersion,
+      full: resync,
+      order: order,
+      added: added,
+      removed: removed,
+      changed: changed,
+      // Time spent in the page, the rest of the evaluate is transfer
+      elapsedMs: performance.now() - started,
+    };
+  }
+
+  // The element `uid` of a snapshot of this document, null when it is gone
+  // (or the uid is from another document), so the caller falls back to the
+  // element path.
+  function elementByUid(uid, docId) {
+    if (docId && docId !== documentId) return null;
+    const element = elementsByUid.get(uid);
+    return element && element.isConnected ? element : null;
+  }
+
+  window.markPage = markPage;
+  window.unmarkPage = unmarkPage;
+  window.pragyaSnapshot = snapshot;
+  window.pragyaIsDirty = isDirty;
+  window.pragyaElement = elementByUid;
+
+  if (document.documentElement) {
+    startObserver();
+  } else {
+    document.addEventListener("DOMContentLoaded", startObserver, { once: true });
+  }
+})();
@@ -0,0 +1,32 @@
+// Resolve once the DOM had no mutation for `quietMs` (true), or after
+// `timeoutMs` without such a pause (false). Evaluated as a function by
+// agent/settle.py.
+([quietMs, timeoutMs]) => new Promise((resolve) => {
+  const start = performance.now();
+  let lastMutation = start;
+  const observer = new MutationObserver(() => {
+    lastMutation = performance.now();
+  });
+  observer.observe(document, {
+    subtree: true,
+    childList: true,
+    characterData: true,
+    attributes: true,
+    // Attributes that change what is shown or clickable, not animations
+    attributeFilter: ["class", "hidden", "disabled", "aria-hidden", "aria-busy", "src", "href", "value"],
+  });
+
+  const check = () => {
+    const now = performance.now();
+    if (now - lastMutation >= quietMs) {
+      observer.disconnect();
+      resolve(true);
+    } else if (now - start >= timeoutMs) {
+      observer.disconnect();
+      resolve(false);
+    } else {
+      setTimeout(check, Math.max(10, Math.min(50, quietMs - (now - lastMutation))));
+    }
+  };
+  setTimeout(check, Math.min(quietMs, timeoutMs));
+})
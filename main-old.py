@@ -80,6 +80,7 @@ class PlaywrightAgent(AgenticGPT):
         model="gpt-4",
         max_steps=100,
         verbose=False,
+        browser_pool=None,
     ):
         """Initialize a Playwright agent. The correct way is to do:
 
@@ -90,12 +91,21 @@ class PlaywrightAgent(AgenticGPT):
 
         as this ensures that the Playwright cleanup is done correctly when
         the agent is done.
+
+        Pass a `agent.browser_pool.BrowserPool` as `browser_pool` to get a fresh
+        context on a warm browser instead of launching a new one. Call
+        `close()` when done so the context goes back to the pool.
         """
         # Instantiate the browser and page.
         self.playwright = playwright_obj
         self.headless = headless
-        self.browser = playwright_obj.chromium.launch(headless=headless)
-        self.browser_context = self.browser.new_context()
+        self.browser_pool = browser_pool
+        if browser_pool is not None:
+            self.browser = None
+            self.browser_context = browser_pool.acquire()
+        else:
+            self.browser = playwright_obj.chromium.launch(headless=headless)
+            self.browser_context = self.browser.new_context()
         self.cookies = cookies
         self.page = self.browser_context.new_page()
 
@@ -301,6 +311,14 @@ class PlaywrightAgent(AgenticGPT):
         with open(output_file, "w") as f:
             f.write(json.dumps(cookies))
 
+    def close(self):
+        """Release the context to the pool, or close the browser we launched."""
+        if self.browser_pool is not None:
+            self.browser_pool.release(self.browser_context)
+        else:
+            self.browser_context.close()
+            self.browser.close()
+
 
 def main():
     """Test it out."""
@@ -308,7 +326,10 @@ def main():
 
     with sync_playwright() as playwright_obj:
         agent = PlaywrightAgent(playwright_obj, objective, verbose=True)
-        agent.run()
+        try:
+            agent.run()
+        finally:
+            agent.close()
 
 
 if __name__ == "__main__":
@@ -1,49 +1,66 @@
+import os
 import asyncio
-import time
 import json
-from helpers import get_filtered_elements
-# from playwright.async_api import async_playwright, Playwright
+import argparse
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright, Playwright
-from agent import ActionAgent, PragyaGPT
+from agent import ActionAgent, PragyaGPT, AsyncActionAgent, AsyncPragyaGPT
+from agent.snapshot import get_snapshot_engine, get_async_snapshot_engine
+from agent.browser_pool import BrowserPool, AsyncBrowserPool
+from agent.llm_cache import CacheMissError
+from agent.blocking import BlockingProfile, ResourceBlocker, DEFAULT_BLOCKED_TYPES
+from helpers import element_ref
+from agent.trajectory import TrajectoryStore, TrajectoryRecorder, TrajectoryReplayer, AsyncTrajectoryReplayer, as_taken_action
+from agent.tracing import Tracer, span
+from agent.scheduler import default_scheduler
 
 
 done = False
 
-def mark_page(page):
-    with open("js/mark_page.js") as f:
-        js = f.read()
-
-    page.evaluate(js)
-    elements = page.evaluate("markPage()")
-    # print(elements)
-    # try:
-    #     page.screenshot(path="screenshot.png")
-    # except Exception as e:
-    #     print("Error (line 28): "+str(e))
-    page.evaluate("unmarkPage()")
-    
-    with open("elements.json", "w") as f:
-        json.dump(elements, f, indent=4)
+# Only probe style and geometry of elements that pass the cheap tag/role/onclick filter
+LAZY_EXTRACTION = False
 
-    clean_elements = []
-    for element in elements:
-        if element["text"] or element["ariaLabel"] or element["placeholder"] or element["label"]:
-            clean_element = {}
-            clean_element["text"] = element["text"]
-            clean_element["ariaLabel"] = element["ariaLabel"]
-            clean_element["path"] = element["path"]
-            clean_element["placeholder"] = element["placeholder"]
-            clean_element["label"] = element["label"]
-            clean_elements.append(clean_element)
+# Snapshot whose elements were last dumped to elements.json
+_dumped_snapshot = None
+
+def mark_page(page, lazy=LAZY_EXTRACTION):
+    """
+    Return the clean elements of the current page state.
+
+    The snapshot is shared until the page navigates, an action is executed or
+    the DOM changes, so asking again for the same state costs no extraction.
+    """
+    # Only the subtrees that changed since the last step are re-extracted
+    snapshot = get_snapshot_engine(page, lazy=lazy).current()
+    dump_snapshot(snapshot)
+    return snapshot.clean_elements
+
+async def mark_page_async(page, lazy=LAZY_EXTRACTION):
+    snapshot = await get_async_snapshot_engine(page, lazy=lazy).current()
+    dump_snapshot(snapshot)
+    return snapshot.clean_elements
+
+def dump_snapshot(snapshot):
+    """Write a new snapshot to elements.json and clean_elements.json."""
+    global _dumped_snapshot
+    if snapshot is _dumped_snapshot:
+        return
 
+    print(f"Page snapshot: {snapshot} {snapshot.diff}")
+    with open("elements.json", "w") as f:
+        json.dump(snapshot.elements, f, indent=4)
     with open("clean_elements.json", "w") as f:
-        json.dump(clean_elements, f, indent=4)
-    return clean_elements
+        json.dump(snapshot.clean_elements, f, indent=4)
+    _dumped_snapshot = snapshot
 
 def clean_elements_id_based(current_page_elements, current_url):
+    """
+    Give every element its index in `current_page_elements` as `id`, so that
+    the id chosen by the LLM maps back to the element path even when some
+    elements are skipped here or pruned from the prompt later.
+    """
     clean_elements = []
-    i = 0
-    for element in current_page_elements:
+    for i, element in enumerate(current_page_elements):
         if "https://www.google.com/search" in current_url and str(element["ariaLabel"]) == "Search":
             continue
         if "https://www.google.com/search" in current_url and str(element["text"]) == "Tools":
@@ -59,64 +76,156 @@ def clean_elements_id_based(current_page_elements, current_url):
         if element["label"]:
             clean_element["label"] = element["label"]
         clean_elements.append(clean_element)
-        i += 1
 
     return clean_elements
 
 
-def run(playwright: Playwright):
-    user_objective = str(input("> Enter your objective: "))
-    chromium = playwright.chromium # or "firefox" or "webkit".
-    options = {
-        'args': [
-            '--disable-gpu',
-            '--disable-dev-shm-usage',
-            '--disable-setuid-sandbox',
-            '--no-first-run',
-            '--no-sandbox',
-            '--no-zygote',
-            '--ignore-certificate-errors',
-            '--disable-extensions',
-            '--disable-infobars',
-            '--disable-notifications',
-            '--disable-popup-blocking',
-            '--remote-debugging-port=9222',
-            '--start-maximized',
-            '--disable-blink-features=AutomationControlled'
-        ],
-        'headless': False  # Set headless option here
-    }
-
-    # Launch Chrome browser with options
-    # browser = chromium.launch(**options)
-    browser = chromium.launch(headless=True, args=['--start-maximized'])
-    page = browser.new_page(no_viewport=True)
+def resolve_element_args(command, current_page_elements):
+    """
+    The args of `command` with the element id of `_click` / `_type` replaced
+    by a reference to the element. The command itself is left as the LLM gave
+    it: it stays in the history, and the references are not fit for prompts.
+    """
+    args = list(command.get("args", []))
+    if command["action"] == "_click" or command["action"] == "_type":
+        # Ids are validated ints already, see agent.output.parse_action
+        args[0] = element_ref(current_page_elements[args[0]])
+        print(f"Next step args: {args}.")
+    return args
+
+
+def step_element(command, current_page_elements):
+    """The element a `_click` / `_type` command acts on, None for other actions."""
+    if command["action"] == "_click" or command["action"] == "_type":
+        return current_page_elements[command["args"][0]]
+    return None
+
+
+def execute_step(agent, command, current_page_elements, recorder=None):
+    """Resolve the element id of `command`, execute it and add it to the trajectory."""
+    url = agent.page.url
+    element = step_element(command, current_page_elements)
+    args = resolve_element_args(command, current_page_elements)
+    agent.execute(command["action"], *args)
+    if recorder is not None:
+        recorder.record(url, command["action"], args, element, command.get("args", []))
+
+
+async def execute_step_async(agent, command, current_page_elements, recorder=None):
+    url = agent.page.url
+    element = step_element(command, current_page_elements)
+    args = resolve_element_args(command, current_page_elements)
+    await agent.execute(command["action"], *args)
+    if recorder is not None:
+        recorder.record(url, command["action"], args, element, command.get("args", []))
+
+
+def replayed_step(pragya, recorder):
+    """Callback of the trajectory replayers: the replayed steps are part of the run."""
+    def on_step(step):
+        recorder.steps.append(step)
+        pragya.actions_taken.append(as_taken_action(step))
+    return on_step
+
+
+def report_trace(tracer, prefix=None):
+    """Print where the time of a run went, and export its spans under `prefix`."""
+    print(tracer.format_summary())
+    if prefix:
+        print("Trace written to " + ", ".join(tracer.export(prefix)))
+
+
+def trace_prefix(prefix, index, count):
+    """One trace per objective when several objectives share a `--trace` prefix."""
+    if prefix and count > 1:
+        return f"{prefix}-{index}"
+    return prefix
+
+
+# How the pooled browsers are launched
+LAUNCH_OPTIONS = {"headless": True, "args": ['--start-maximized']}
+
+
+def run(playwright: Playwright, pool: BrowserPool = None, user_objective=None, stream=False, blocking=None,
+        trajectories=None, trace=None, tracer=None, priority=0, observe_and_act=False):
+    """
+    Run one objective in a fresh context of a warm browser from `pool`.
+
+    Without a pool a one-off pool is created (and closed) for this objective.
+    With `stream` the next action is executed as soon as its command is
+    received, while the LLM is still writing its thoughts. With a `blocking`
+    profile the requests it blocks (images, fonts, ads...) are aborted.
+    With a `trajectories` store, a stored successful run of the same objective
+    is replayed without the LLM first, and successful runs are stored.
+    The time of every step is traced and summarized at the end; `trace` is a
+    path prefix to export the spans to (see `agent.tracing`), `tracer` the
+    `Tracer` to record into (a new one by default). The LLM requests wait for
+    the rate limits of the API in the queue of `agent.scheduler`, where the
+    sessions with a lower `priority` go first. With `observe_and_act` every
+    step is one LLM call that returns the observation with the next action,
+    instead of an observation call and an action call.
+    """
+    if user_objective is None:
+        user_objective = str(input("> Enter your objective: "))
+    tracer = tracer or Tracer()
+    own_pool = pool is None
+    if own_pool:
+        pool = BrowserPool(playwright, size=1, launch_options=LAUNCH_OPTIONS)
+    try:
+        # The context goes back to the pool even when the run fails
+        with tracer.activate(objective=user_objective), pool.context(no_viewport=True) as context:
+            _run(context, user_objective, stream, blocking, trajectories, priority, observe_and_act)
+    finally:
+        if own_pool:
+            pool.close()
+        report_trace(tracer, trace)
+
+
+def _run(context, user_objective, stream, blocking, trajectories, priority, observe_and_act):
+    blocker = ResourceBlocker(blocking) if blocking else None
+    if blocker:
+        blocker.install(context)
+    page = context.new_page()
 
     agent = ActionAgent(page)
-    pragya = PragyaGPT()
+    pragya = PragyaGPT(stream=stream, priority=priority, observe_and_act=observe_and_act)
+    recorder = TrajectoryRecorder()
 
-    final_goal = pragya.get_final_goal(user_objective)
-    print("\n\nFINAL GOAL:\n")
-    print(final_goal)
-    print("\n")
+    #  R E P L A Y
+
+    replayed = 0
+    trajectory = trajectories.load(user_objective) if trajectories else None
+    if trajectory:
+        with span("replay", steps=len(trajectory)) as trace:
+            replayed = TrajectoryReplayer(agent).replay(trajectory, on_step=replayed_step(pragya, recorder))
+            trace.set(replayed=replayed)
+        print(f"\nREPLAYED {replayed}/{len(trajectory)} STORED STEPS\n")
+
+    if not agent.get_goal_achieved():
+        final_goal = pragya.get_final_goal(user_objective)
+        print("\n\nFINAL GOAL:\n")
+        print(final_goal)
+        print("\n")
 
     #  F I R S T   S T E P
 
     trail_left = 5
     error=None
-    while trail_left > 0:
+    while not replayed and trail_left > 0:
         try:
-            first_step = pragya.get_first_step(user_objective, error)
-            if "args" in first_step["command"]:
-                action_args = first_step["command"]["args"]
+            with span("step", index=0):
+                first_step = pragya.get_first_step(user_objective, error)
 
-            agent.execute(first_step["command"]["action"], *action_args)
-            agent.wait_till_idle()
+                execute_step(agent, first_step["command"], [], recorder)
+                agent.wait_till_idle()
 
             trail_left = 5
             error = None
 
             break
+        except CacheMissError:
+            # Replay runs must not diverge from the recorded prompts
+            raise
         except Exception as e:
             print("Error (line 115): "+str(e))
             error = str(e)
@@ -125,13 +234,15 @@ def run(playwright: Playwright):
 
     #  O B S E R V A T I O N  O F  F I R S T  S T E P
 
-    current_url = page.url
-    current_page_elements = mark_page(page)
-    clean_elements = clean_elements_id_based(current_page_elements, current_url)
-    observation = pragya._observation(current_url, clean_elements)
-    print("\n\nOBSERVATION (line 83):\n")
-    print(observation)
-    print("\n")
+    # In observe-and-act mode the next action observes the page itself
+    if not agent.get_goal_achieved() and not observe_and_act:
+        current_url = page.url
+        current_page_elements = mark_page(page)
+        clean_elements = clean_elements_id_based(current_page_elements, current_url)
+        observation = pragya._observation(current_url, clean_elements)
+        print("\n\nOBSERVATION (line 83):\n")
+        print(observation)
+        print("\n")
 
     #  N E X T  S T E P  L O O P
 
@@ -140,60 +251,312 @@ def run(playwright: Playwright):
     while not agent.get_goal_achieved() and trail_left > 0:
         try:
             # NEXT STEP
-            current_url = page.url
-            current_page_elements = mark_page(page)
-            clean_elements = clean_elements_id_based(current_page_elements, current_url)
-            with open("clean_elements_id_based.json", "w") as f:
-                json.dump(clean_elements, f, indent=4)
-            _ += 1
-            print(f"Entering next step x{_}!!")
-            next_step = pragya._next_action(objective=user_objective, current_page_elements=clean_elements, current_url=current_url, error=error)
-            print("Next step done!!")
-
-            if next_step["command"]["action"] == "_click" or next_step["command"]["action"] == "_type":
-                if "id" in str(next_step["command"]["args"][0]):
-                    # just take out whatever number is present in the string
-                    next_step["command"]["args"][0] = int(''.join(filter(str.isdigit, next_step["command"]["args"][0])))
-                next_step["command"]["args"][0] = current_page_elements[int(next_step["command"]["args"][0])]["path"]
-                print(f"Next step args: {next_step['command']['args']}.")
-
-            if "args" in next_step["command"]:
-                action_args = next_step["command"]["args"]
-
-            # EXECUTE NEXT STEP
-
-            agent.execute(next_step["command"]["action"], *action_args)
-            agent.wait_till_idle()
-
-            # OBSERVATION OF NEXT STEP
-
-            current_url = page.url
-            current_page_elements = mark_page(page)
-            clean_elements = clean_elements_id_based(current_page_elements, current_url)
-            observation = pragya._observation(current_url, clean_elements)
-            print("\n\nOBSERVATION:\n")
-            print(observation)
-            print("\n")
+            with span("step", index=_ + 1):
+                current_url = page.url
+                current_page_elements = mark_page(page)
+                clean_elements = clean_elements_id_based(current_page_elements, current_url)
+                with open("clean_elements_id_based.json", "w") as f:
+                    json.dump(clean_elements, f, indent=4)
+                _ += 1
+                print(f"Entering next step x{_}!!")
+                dispatched = []
+
+                def on_command(command):
+                    # Streaming mode: execute the command while the thoughts are generated
+                    dispatched.append(command)
+                    execute_step(agent, command, current_page_elements, recorder)
+
+                next_step = pragya._next_action(objective=user_objective, current_page_elements=clean_elements, current_url=current_url, error=error, on_command=on_command)
+                print("Next step done!!")
+
+                # EXECUTE NEXT STEP
+
+                if not dispatched:
+                    execute_step(agent, next_step["command"], current_page_elements, recorder)
+                agent.wait_till_idle()
+
+                # OBSERVATION OF NEXT STEP
+
+                if not observe_and_act:
+                    current_url = page.url
+                    current_page_elements = mark_page(page)
+                    clean_elements = clean_elements_id_based(current_page_elements, current_url)
+                    observation = pragya._observation(current_url, clean_elements)
+                    print("\n\nOBSERVATION:\n")
+                    print(observation)
+                    print("\n")
 
             trail_left = 5
             error = None
             
+        except CacheMissError:
+            # Replay runs must not diverge from the recorded prompts
+            raise
         except Exception as e:
             print("Error (line 175): "+str(e))
             error = str(e)
             trail_left -= 1
             print(f"\nTRIAL LEFT: {trail_left} times\n")
 
-    agent._wait(5)
+    agent.wait_till_idle()
     print("\n\nFINALLY GOAL ACHIEVED!! 🥳\n\n") if not error else print(f"\n\nERROR OCCURED!! 😢\n{error}\n\n")
-    browser.close()
+    print("Action timings: " + json.dumps(agent.stats.summary()))
+    print("Page settles: " + json.dumps(agent.settle.summary()))
+    print("LLM usage: " + json.dumps(pragya.usage))
+    print("LLM queue: " + json.dumps(default_scheduler().metrics()))
+    if pragya.cascade:
+        print("Model cascade: " + json.dumps(pragya.cascade.summary()))
+    if blocker:
+        print("Blocked resources: " + json.dumps(blocker.summary()))
+    if trajectories and agent.get_goal_achieved() and not error:
+        trajectories.save(user_objective, recorder.steps, page.url)
+
+
+
+async def observe_async(pragya, current_url, clean_elements):
+    observation = await pragya._observation(current_url, clean_elements)
+    print("\n\nOBSERVATION:\n")
+    print(observation)
+    print("\n")
+    return observation
+
+
+async def run_async(pool: AsyncBrowserPool, user_objective, stream=False, blocking=None, trajectories=None, trace=None,
+                    priority=0, observe_and_act=False):
+    """
+    Asyncio version of `run` for one objective, in its own pooled browser context.
+
+    The observation of a step runs as a background task while the page of the
+    next step is extracted, and is awaited before the next action it feeds.
+    """
+    # Every task has its own context, so concurrent runs get their own tracer
+    tracer = Tracer()
+    try:
+        with tracer.activate(objective=user_objective):
+            async with pool.context(no_viewport=True) as context:
+                await _run_async(context, user_objective, stream, blocking, trajectories, priority, observe_and_act)
+    finally:
+        report_trace(tracer, trace)
+
+
+async def _run_async(context, user_objective, stream, blocking, trajectories, priority, observe_and_act):
+    blocker = ResourceBlocker(blocking) if blocking else None
+    if blocker:
+        await blocker.install_async(context)
+    page = await context.new_page()
+
+    agent = AsyncActionAgent(page)
+    pragya = AsyncPragyaGPT(stream=stream, priority=priority, observe_and_act=observe_and_act)
+    recorder = TrajectoryRecorder()
+
+    #  R E P L A Y
+
+    replayed = 0
+    trajectory = trajectories.load(user_objective) if trajectories else None
+    if trajectory:
+        with span("replay", steps=len(trajectory)) as trace:
+            replayed = await AsyncTrajectoryReplayer(agent).replay(trajectory, on_step=replayed_step(pragya, recorder))
+            trace.set(replayed=replayed)
+        print(f"\nREPLAYED {replayed}/{len(trajectory)} STORED STEPS ({user_objective})\n")
+
+    if not agent.get_goal_achieved():
+        final_goal = await pragya.get_final_goal(user_objective)
+        print("\n\nFINAL GOAL:\n")
+        print(final_goal)
+        print("\n")
 
+    #  F I R S T   S T E P
 
+    trail_left = 5
+    error = None
+    while not replayed and trail_left > 0:
+        try:
+            with span("step", index=0):
+                first_step = await pragya.get_first_step(user_objective, error)
+
+                await execute_step_async(agent, first_step["command"], [], recorder)
+                await agent.wait_till_idle()
 
-# async def start():
-#     async with async_playwright() as playwright:
-#         await run(playwright)
-# asyncio.run(start())
+            trail_left = 5
+            error = None
 
-with sync_playwright() as playwright:
-    run(playwright)
+            break
+        except CacheMissError:
+            # Replay runs must not diverge from the recorded prompts
+            raise
+        except Exception as e:
+            print("Error (first step): "+str(e))
+            error = str(e)
+            trail_left -= 1
+            print(f"\nTRIAL LEFT: {trail_left} times\n")
+
+    #  O B S E R V A T I O N  O F  F I R S T  S T E P
+
+    observation_task = None
+    # In observe-and-act mode the next action observes the page itself
+    if not agent.get_goal_achieved() and not observe_and_act:
+        current_url = page.url
+        current_page_elements = await mark_page_async(page)
+        clean_elements = clean_elements_id_based(current_page_elements, current_url)
+        observation_task = asyncio.create_task(observe_async(pragya, current_url, clean_elements))
+
+    #  N E X T  S T E P  L O O P
+
+    _ = 0
+
+    try:
+        while not agent.get_goal_achieved() and trail_left > 0:
+            try:
+                # NEXT STEP
+                with span("step", index=_ + 1):
+                    current_url = page.url
+                    current_page_elements = await mark_page_async(page)
+                    clean_elements = clean_elements_id_based(current_page_elements, current_url)
+                    _ += 1
+                    print(f"Entering next step x{_}!!")
+                    dispatched = []
+
+                    async def on_command(command):
+                        dispatched.append(command)
+                        await execute_step_async(agent, command, current_page_elements, recorder)
+
+                    if observation_task is not None:
+                        await observation_task
+                        observation_task = None
+                    next_step = await pragya._next_action(objective=user_objective, current_page_elements=clean_elements, current_url=current_url, error=error, on_command=on_command)
+                    print("Next step done!!")
+
+                    # EXECUTE NEXT STEP
+
+                    if not dispatched:
+                        await execute_step_async(agent, next_step["command"], current_page_elements, recorder)
+                    await agent.wait_till_idle()
+
+                    # OBSERVATION OF NEXT STEP
+
+                    if not observe_and_act:
+                        current_url = page.url
+                        current_page_elements = await mark_page_async(page)
+                        clean_elements = clean_elements_id_based(current_page_elements, current_url)
+                        observation_task = asyncio.create_task(observe_async(pragya, current_url, clean_elements))
+
+                trail_left = 5
+                error = None
+
+            except CacheMissError:
+                # Replay runs must not diverge from the recorded prompts
+                raise
+            except Exception as e:
+                print("Error (next step): "+str(e))
+                error = str(e)
+                trail_left -= 1
+                print(f"\nTRIAL LEFT: {trail_left} times\n")
+    finally:
+        if observation_task is not None and not observation_task.done():
+            observation_task.cancel()
+
+    await agent.wait_till_idle()
+    print(f"\n\nFINALLY GOAL ACHIEVED!! 🥳 ({user_objective})\n\n") if not error else print(f"\n\nERROR OCCURED!! 😢 ({user_objective})\n{error}\n\n")
+    print(f"Action timings ({user_objective}): " + json.dumps(agent.stats.summary()))
+    print(f"Page settles ({user_objective}): " + json.dumps(agent.settle.summary()))
+    print(f"LLM usage ({user_objective}): " + json.dumps(pragya.usage))
+    if pragya.cascade:
+        print(f"Model cascade ({user_objective}): " + json.dumps(pragya.cascade.summary()))
+    if blocker:
+        print(f"Blocked resources ({user_objective}): " + json.dumps(blocker.summary()))
+    if trajectories and agent.get_goal_achieved() and not error:
+        trajectories.save(user_objective, recorder.steps, page.url)
+
+
+async def run_many(objectives, pool_size=1, cdp_url=None, stream=False, blocking=None, trajectories=None, trace=None,
+                   priorities=None, observe_and_act=False):
+    """
+    Run several objectives concurrently from a single event loop and browser pool.
+
+    Their LLM requests share the rate limits of the API (see `agent.scheduler`);
+    `priorities` gives the priority of every objective, lower first (all 0 by default).
+    """
+    priorities = priorities or [0] * len(objectives)
+    async with async_playwright() as playwright:
+        pool = AsyncBrowserPool(playwright, size=pool_size, cdp_url=cdp_url, launch_options=LAUNCH_OPTIONS)
+        try:
+            await asyncio.gather(*(
+                run_async(pool, objective, stream, blocking, trajectories, trace_prefix(trace, index, len(objectives)),
+                          priorities[index], observe_and_act)
+                for index, objective in enumerate(objectives)
+            ))
+        finally:
+            await pool.close()
+    print("LLM queue: " + json.dumps(default_scheduler().metrics()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("objectives", nargs="*", help="objectives to run (concurrently with --async)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use the asyncio agent stack")
+    parser.add_argument("--pool-size", type=int, default=1, help="number of warm browsers to keep")
+    parser.add_argument("--cdp-url", default=None, help="attach to a running browser instead of launching one")
+    parser.add_argument("--llm-cache", choices=["off", "on", "replay"], default=None,
+                        help="serve identical LLM requests from disk; replay fails on cache misses")
+    parser.add_argument("--llm-provider", choices=["groq", "openai"], default=None,
+                        help="LLM API to use, openai being any OpenAI-compatible endpoint")
+    parser.add_argument("--llm-base-url", default=None,
+                        help="endpoint of the LLM API, e.g. a local stand-in (benchmarks/stub_llm.py)")
+    parser.add_argument("--llm-limits", default=None, metavar="MODEL=RPM/TPM,...",
+                        help="requests and tokens per minute allowed per model (see agent.scheduler)")
+    parser.add_argument("--cascade", default=None, metavar="MODEL,...",
+                        help="models asked for the next action, small to large, or off (see agent.cascade)")
+    parser.add_argument("--priorities", type=int, nargs="+", default=None,
+                        help="priority of every objective for the LLM rate limits, lower first")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream replies and execute each action before its thoughts are complete")
+    parser.add_argument("--observe-and-act", action="store_true",
+                        help="one LLM call per step for the observation and the next action")
+    parser.add_argument("--fast", action="store_true",
+                        help="block images, media, fonts and analytics/ad domains")
+    parser.add_argument("--block-types", default=None,
+                        help="comma separated resource types blocked with --fast (default: image,media,font)")
+    parser.add_argument("--trajectories", nargs="?", const=".trajectories", default=None, metavar="DIR",
+                        help="store successful runs and replay them without the LLM when the objective repeats")
+    parser.add_argument("--trace", default=None, metavar="PREFIX",
+                        help="export the step timings to PREFIX.jsonl and PREFIX.trace.json (Chrome trace format)")
+    cli_args = parser.parse_args()
+
+    if cli_args.llm_cache:
+        os.environ["PRAGYA_LLM_CACHE"] = cli_args.llm_cache
+    if cli_args.llm_provider:
+        os.environ["PRAGYA_LLM_PROVIDER"] = cli_args.llm_provider
+    if cli_args.llm_base_url:
+        os.environ["PRAGYA_LLM_BASE_URL"] = cli_args.llm_base_url
+    if cli_args.cascade:
+        os.environ["PRAGYA_LLM_CASCADE"] = cli_args.cascade
+    if cli_args.llm_limits:
+        os.environ["PRAGYA_LLM_LIMITS"] = cli_args.llm_limits
+
+    blocking = None
+    if cli_args.fast:
+        blocking = BlockingProfile(
+            resource_types=cli_args.block_types.split(",") if cli_args.block_types else DEFAULT_BLOCKED_TYPES
+        )
+
+    trajectories = TrajectoryStore(cli_args.trajectories) if cli_args.trajectories else None
+
+    objectives = cli_args.objectives or [str(input("> Enter your objective: "))]
+    if cli_args.priorities and len(cli_args.priorities) != len(objectives):
+        parser.error("--priorities needs one priority per objective")
+    if cli_args.use_async:
+        asyncio.run(run_many(objectives, pool_size=cli_args.pool_size, cdp_url=cli_args.cdp_url, stream=cli_args.stream, blocking=blocking,
+                             trajectories=trajectories, trace=cli_args.trace, priorities=cli_args.priorities,
+                             observe_and_act=cli_args.observe_and_act))
+    else:
+        with sync_playwright() as playwright:
+            # One warm browser serves every objective in turn
+            pool = BrowserPool(playwright, size=cli_args.pool_size, cdp_url=cli_args.cdp_url, launch_options=LAUNCH_OPTIONS)
+            try:
+                for index, objective in enumerate(objectives):
+                    run(playwright, pool=pool, user_objective=objective, stream=cli_args.stream, blocking=blocking,
+                        trajectories=trajectories, trace=trace_prefix(cli_args.trace, index, len(objectives)),
+                        priority=cli_args.priorities[index] if cli_args.priorities else 0,
+                        observe_and_act=cli_args.observe_and_act)
+            finally:
+                pool.close()